@@ -0,0 +1,130 @@
+# Shared PDF to DOCX conversion logic used by the single and batch converters.
+# Reference: https://developer.adobe.com/document-services/docs/overview/pdf-services-api/quickstarts/python/
+
+import logging
+import os
+import random
+import shutil
+import time
+from functools import lru_cache, wraps
+
+from adobe.pdfservices.operation.auth.service_principal_credentials import ServicePrincipalCredentials
+from adobe.pdfservices.operation.exception.exceptions import ServiceApiException
+from adobe.pdfservices.operation.io.cloud_asset import CloudAsset
+from adobe.pdfservices.operation.io.stream_asset import StreamAsset
+from adobe.pdfservices.operation.pdf_services import PDFServices
+from adobe.pdfservices.operation.pdf_services_media_type import PDFServicesMediaType
+from adobe.pdfservices.operation.pdfjobs.jobs.export_pdf_job import ExportPDFJob
+from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_params import ExportPDFParams
+from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_target_format import ExportPDFTargetFormat
+from adobe.pdfservices.operation.pdfjobs.result.export_pdf_result import ExportPDFResult
+from dotenv import load_dotenv
+
+# Load the PDF Services credentials from a .env file, if there is one.
+load_dotenv()
+
+CREDENTIAL_VARS = ('PDF_SERVICES_CLIENT_ID', 'PDF_SERVICES_CLIENT_SECRET')
+
+# Retry settings for transient PDF Services errors (rate limits, 5xx, dropped connections).
+MAX_ATTEMPTS = 5
+RETRY_MIN_DELAY = 2
+RETRY_MAX_DELAY = 60
+
+
+def read_credentials():
+    """Read the PDF Services credentials once, failing with a clear message if any are missing."""
+    missing = [name for name in CREDENTIAL_VARS if not os.getenv(name)]
+    if missing:
+        raise KeyError(f"Missing PDF Services credentials: {', '.join(missing)}. "
+                       "Set them in the environment or in a .env file.")
+    return tuple(os.environ[name] for name in CREDENTIAL_VARS)
+
+
+def is_transient(error):
+    """Rate limits and server side errors are worth retrying, other API errors are not."""
+    status_code = error.get_status_code()
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def retry_transient(func):
+    """Retry func with exponential backoff when PDF Services returns a transient error.
+
+    ServiceUsageException (quota exhausted) and SdkException are not retried, another
+    attempt would only fail the same way.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return func(*args, **kwargs)
+            except ServiceApiException as e:
+                if attempt == MAX_ATTEMPTS or not is_transient(e):
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_MIN_DELAY * 2 ** (attempt - 1))
+                delay += random.uniform(0, delay / 2)
+                logging.warning("%s failed (attempt %d/%d): %s, retrying in %.1fs",
+                                func.__name__, attempt, MAX_ATTEMPTS, e, delay)
+                time.sleep(delay)
+    return wrapper
+
+
+@lru_cache(maxsize=1)
+def get_services():
+    """Create the PDFServices client once per process and reuse it for every conversion."""
+    client_id, client_secret = read_credentials()
+    credentials = ServicePrincipalCredentials(client_id=client_id, client_secret=client_secret)
+    return PDFServices(credentials=credentials)
+
+
+@retry_transient
+def submit_pdf(pdf_services, file_path):
+    """Upload a PDF and submit a DOCX export job for it. Returns the job location."""
+
+    # Create an Asset(s) from the source file(s) and upload. The open file is handed
+    # to the SDK so the upload streams from disk instead of reading the whole PDF into memory.
+    with open(file_path, 'rb') as input_stream:
+        input_asset = pdf_services.upload(input_stream=input_stream, mime_type=PDFServicesMediaType.PDF)
+
+    # Create parameters for the job.
+    export_pdf_params = ExportPDFParams(target_format=ExportPDFTargetFormat.DOCX)
+
+    # Create a new job instance and submit it.
+    export_pdf_job = ExportPDFJob(input_asset=input_asset, export_pdf_params=export_pdf_params)
+    return pdf_services.submit(export_pdf_job)
+
+
+@retry_transient
+def download_result(pdf_services, location, output_file_path):
+    """Wait for a submitted export job and write the resulting DOCX to output_file_path."""
+
+    # Get the job result, this polls Adobe until the conversion is done.
+    pdf_services_response = pdf_services.get_job_result(location, ExportPDFResult)
+
+    # Get the Content from the resulting asset.
+    result_asset: CloudAsset = pdf_services_response.get_result().get_asset()
+    stream_asset: StreamAsset = pdf_services.get_content(result_asset)
+
+    # The SDK hands back bytes today; copy in 1 MiB chunks if it ever returns a file-like stream.
+    # Written under a temporary name in the same directory first and then moved into place, so an
+    # interrupted run never leaves a truncated DOCX that looks newer than its PDF.
+    output_stream = stream_asset.get_input_stream()
+    temp_path = f"{output_file_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            if hasattr(output_stream, "read"):
+                shutil.copyfileobj(output_stream, file, length=1024 * 1024)
+            else:
+                file.write(memoryview(output_stream))
+        os.replace(temp_path, output_file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return output_file_path
+
+
+def convert_pdf_to_docx(pdf_services, file_path, output_file_path):
+    """Convert a single PDF to DOCX end to end. Returns the output file path."""
+    location = submit_pdf(pdf_services, file_path)
+    return download_result(pdf_services, location, output_file_path)
@@ -1,28 +1,62 @@
 #Converts the PDFs found in a directory into docx using the Adobe SDK. 
 # Reference: https://developer.adobe.com/document-services/docs/overview/pdf-services-api/quickstarts/python/
 
-import dotenv
+import argparse
+import asyncio
 import logging
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
-from adobe.pdfservices.operation.auth.service_principal_credentials import ServicePrincipalCredentials
 from adobe.pdfservices.operation.exception.exceptions import ServiceApiException, ServiceUsageException, SdkException
-from adobe.pdfservices.operation.io.cloud_asset import CloudAsset
-from adobe.pdfservices.operation.io.stream_asset import StreamAsset
-from adobe.pdfservices.operation.pdf_services import PDFServices
-from adobe.pdfservices.operation.pdf_services_media_type import PDFServicesMediaType
-from adobe.pdfservices.operation.pdfjobs.jobs.export_pdf_job import ExportPDFJob
-from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_params import ExportPDFParams
-from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_target_format import ExportPDFTargetFormat
-from adobe.pdfservices.operation.pdfjobs.result.export_pdf_result import ExportPDFResult
 
-# Define the directory containing the PDFs
-pdf_folder = os.path.join("..", "data", "knowledge-base")
+from _core import download_result, get_services, read_credentials, submit_pdf
 
-# List all o fthe PDF files found in the directory. 
-pdf_files = [f for f in os.listdir(pdf_folder) if f.endswith('.pdf')]
+# Command line options.
+parser = argparse.ArgumentParser(description='Convert the PDFs in the knowledge base to DOCX using the Adobe SDK')
+parser.add_argument('--force', '-f', action='store_true',
+                    help='Reconvert files even if an up-to-date DOCX already exists')
+args = parser.parse_args()
+
+# Define the directory containing the PDFs, and where the converted files go.
+pdf_folder = Path("..") / "data" / "knowledge-base"
+output_folder = pdf_folder / "docx"
+
+def output_path_for(pdf_file):
+    """Create correct extension for the converted file."""
+    return output_folder / Path(pdf_file).with_suffix('.docx').name
+
+def is_converted(pdf_entry):
+    """True if the DOCX exists and is newer than its source PDF."""
+    try: 
+        return output_path_for(pdf_entry.name).stat().st_mtime >= pdf_entry.stat().st_mtime
+    except FileNotFoundError: 
+        return False
+
+# List all of the PDF files found in the directory. scandir gets each entry's file
+# type from the directory read, so is_file() is free; stat() still makes a syscall
+# the first time it is called on an entry and is cached after that.
+with os.scandir(pdf_folder) as it: 
+    pdf_entries = [e for e in it if e.is_file() and e.name.endswith('.pdf')]
+
+# Skip files converted by a previous run, unless --force is given. 
+if not args.force: 
+    remaining_entries = [e for e in pdf_entries if not is_converted(e)]
+    skipped = len(pdf_entries) - len(remaining_entries)
+    if skipped: 
+        print(f"\nSkipping {skipped} already converted file(s), use --force to reconvert.")
+    pdf_entries = remaining_entries
+
+# Largest files first (Longest-Processing-Time scheduling): the big jobs start
+# early and the small ones fill in around them, so one large PDF doesn't end up
+# running alone at the end of the batch. LPT keeps the makespan within 4/3 of
+# optimal, don't change this back to alphabetical order.
+pdf_entries.sort(key=lambda e: e.stat().st_size, reverse=True)
+
+pdf_files = [e.name for e in pdf_entries]
 
 # Count the number of files to convert.
 files_remaining = len(pdf_files) 
@@ -34,6 +68,13 @@ for pdf_file in pdf_files:
 print(f"\nTotal Files to Convert: {files_remaining}")
 print("\n") 
 
+# Check the credentials before asking, so nobody confirms a run that can't start. 
+try: 
+    read_credentials()
+except KeyError as e: 
+    print(f"{e.args[0]}\n")
+    sys.exit(1)
+
 # Ask for user confirmation, cancel if "anything but yes or y"
 confirmation = input("> Proceed with conversion? (y/n):").strip().lower()
 
@@ -44,67 +85,111 @@ else:
     sys.exit() #terminates the script. 
 
 # Start error logging and handling
-logging.basicConfig(filename='conversion_log.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - $(message)s')
+logging.basicConfig(filename='conversion_log.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logging.info("Starting PDF to DOCX conversion for multiple files.")
 
-# Initial Setup and retieve credentials. 
-credentials = ServicePrincipalCredentials(
-    client_id=os.getenv('PDF_SERVICES_CLIENT_ID'),
-    client_secret=os.getenv('PDF_SERVICES_CLIENT_SECRET')
-)
-
-# Create a services Instance. 
-pdf_services=PDFServices(credentials=credentials)
-
-# Process each file. 
-for pdf_file in pdf_files: 
+# Initial Setup and retieve credentials. get_services() builds one PDFServices client per
+# process; workers call it instead of creating their own so every job reuses the same
+# connection pool rather than paying a fresh TLS handshake per file. 
+get_services()
+
+# Make sure the output folder exists once, before any workers start writing to it.
+output_folder.mkdir(parents=True, exist_ok=True)
+
+# Guards the shared remaining-files counter across worker threads.
+progress_lock = threading.Lock()
+
+# Set once Adobe reports the account quota is used up. Files not yet submitted are skipped
+# instead of each one failing the same way; jobs already submitted are still collected.
+quota_exhausted = threading.Event()
+
+def stop_batch(pdf_file, e):
+    """Record a quota failure and stop the rest of the batch."""
+    logging.error("Quota exhausted while processing %s, stopping the batch: %s", pdf_file, e)
+    if not quota_exhausted.is_set():
+        print("PDF Services quota exhausted, not submitting the remaining files. Check the logs for details.")
+    quota_exhausted.set()
+
+def submit_one(pdf_entry):
+    """Upload a single PDF and submit its export job. Returns the job location, or None on failure."""
+    pdf_file = pdf_entry.name
+    if quota_exhausted.is_set():
+        return None
     try: 
-        file_path = os.path.join(pdf_folder, pdf_file) 
-        with open(file_path, 'rb') as file: 
-            input_stream = file.read()
+        file_path = pdf_entry.path 
         
         # Debugging and logging the steps. 
-        print(f"Processing file: {pdf_file}")
-        logging.info(f"Processing file: {os.path.abspath(file_path)}")
-
-        # Create an Asset(s) from the source file(s) and upload
-        input_asset = pdf_services.upload(input_stream=input_stream, mime_type=PDFServicesMediaType.PDF)
-
-        # Create paramters for the job.
-        export_pdf_params = ExportPDFParams(target_format=ExportPDFTargetFormat.DOCX) 
-
-        # Create a new job instance. 
-        export_pdf_job = ExportPDFJob(input_asset=input_asset, export_pdf_params=export_pdf_params)
-
-        # Submit job and get result. 
-        location = pdf_services.submit(export_pdf_job)
-        pdf_services_response = pdf_services.get_job_result(location, ExportPDFResult) 
-
-        # Get the Content from the resulting asset: 
-        result_asset: CloudAsset = pdf_services_response.get_result().get_asset()
-        stream_asset: StreamAsset = pdf_services.get_content(result_asset) 
-
-        # Define output file path, check to make sure the folder exists. 
-        output_folder = os.path.join("..", "data", "knowledge-base", "docx") 
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
+        print(f"Submitting file: {pdf_file}")
+        logging.info("Submitting file: %s", os.path.abspath(file_path))
 
+        # Upload and submit the job, the result is collected in the second stage. 
+        return submit_pdf(get_services(), file_path)
+    
+    #Error Handling - kept per file so one failure doesn't cancel the rest of the batch. 
+    #Transient API errors have already been retried by submit_pdf. 
+    except ServiceUsageException as e: 
+        stop_batch(pdf_file, e)
+        return None
+    except (ServiceApiException, SdkException) as e: 
+        logging.error("Error submitting %s: %s", pdf_file, e)
+        print(f"Failed to submit {pdf_file}, check the logs for details.")
+        return None
+
+def collect_one(pdf_file, location):
+    """Wait for a submitted export job and write the DOCX. Returns True on success."""
+    global files_remaining
+    # No quota check here: a submitted job is already paid for and converting at Adobe.
+    try: 
         # Create correct extension for new file. 
-        output_file_path = os.path.join(output_folder, pdf_file.replace('.pdf', '.docx'))
+        output_file_path = output_path_for(pdf_file)
 
-        # Print file to new path. 
-        with open(output_file_path, "wb") as file: 
-            file.write(stream_asset.get_input_stream())
+        # Wait for the job and print file to new path. 
+        download_result(get_services(), location, output_file_path)
 
         # Print success / falure, and log info. 
         print(f"File successfullly written to {output_file_path}\n")
-        logging.info(f"Successfully converted {pdf_file} to DOCX.")
+        logging.info("Successfully converted %s to DOCX.", pdf_file)
 
         # Print the total number of files remaining to process: 
-        files_remaining -= 1 
-        print(f"Files Remaining to Process: {files_remaining}\n")
+        with progress_lock:
+            files_remaining -= 1 
+            print(f"Files Remaining to Process: {files_remaining}\n")
+        return True
     
-    #Error Handling
-    except (ServiceApiException, ServiceUsageException, SdkException) as e: 
-        logging.error(f"Error processing {pdf_file}: {str(e)}")
-        print(f"Failed to proces {pdf_file}, check the logs for details.") 
\ No newline at end of file
+    #Error Handling - kept per file so one failure doesn't cancel the other workers. 
+    except ServiceUsageException as e: 
+        stop_batch(pdf_file, e)
+        return False
+    except (ServiceApiException, SdkException) as e: 
+        logging.error("Error processing %s: %s", pdf_file, e)
+        print(f"Failed to proces {pdf_file}, check the logs for details.")
+        return False
+
+async def convert_all(pdf_entries, max_concurrent):
+    """Run both conversion stages on one event loop, at most max_concurrent SDK calls in flight."""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    # The SDK only has blocking calls, so they run on a pool sized to the semaphore.
+    # get_job_result sleeps between status polls, so most of these threads are idle
+    # waiting on Adobe rather than doing work.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_concurrent))
+
+    async def limited(func, *func_args):
+        async with semaphore: 
+            return await loop.run_in_executor(None, func, *func_args)
+
+    # Stage 1: upload and submit every job. 
+    locations = await asyncio.gather(*(limited(submit_one, e) for e in pdf_entries))
+    submitted = [(e.name, location) for e, location in zip(pdf_entries, locations) if location]
+
+    # Stage 2: collect the results, Adobe converts the submitted jobs in parallel. 
+    return await asyncio.gather(*(limited(collect_one, name, location) for name, location in submitted))
+
+# Process the files in two stages: upload and submit every job first, then collect
+# the results. Adobe converts the submitted jobs server-side in parallel, so the
+# polling in the second stage overlaps instead of running one job at a time.
+# The PDFServices client is shared between workers (its underlying requests
+# session is thread-safe).
+max_concurrent = int(os.getenv("PDF_WORKERS", "64"))
+asyncio.run(convert_all(pdf_entries, max_concurrent))
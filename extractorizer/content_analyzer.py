@@ -5,22 +5,292 @@ For documents that don't have embedded table of contents but have visual structu
 """
 
 import os
+import sys
 import fitz  # PyMuPDF
 import argparse
 import re
+import math
+import heapq
+from bisect import bisect_left
+from array import array
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
 import statistics
-import asyncio
+import atexit
+import threading
+import hashlib
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 # Configuration
 DEBUG = False
+PARALLEL_MIN_PAGES = 20  # Below this, starting worker processes costs more than it saves
+# Text extraction flags: image blocks (with their raw image bytes) are never used by the
+# analysis, so PyMuPDF is told not to build them. TEXT_PRESERVE_LIGATURES stays set: clearing
+# it makes MuPDF expand ligatures into separate characters, which is extra work and changes
+# the extracted text and character counts.
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+# MuPDF keeps span font sizes as 32-bit floats, so storing them as 'f' loses nothing
+# and takes half the memory of 'd'
+SPAN_SIZE_TYPECODE = 'f'
+REPORT_CACHE_SIZE = 8  # Most recent content reports kept per process
+# Reports are also saved here as JSON, keyed by PDF content, so they survive across processes
+# (empty PDF_STRUCTURE_CACHE_DIR disables the disk cache). Bump ANALYZER_VERSION whenever
+# the analysis or the report layout changes, so older cached reports are ignored.
+REPORT_CACHE_DIR = os.getenv("PDF_STRUCTURE_CACHE_DIR", os.path.join(".cache", "pdf_structure"))
+ANALYZER_VERSION = 4
+
+# Compiled once, matched against every analyzed line
+NUMBERED_RE = re.compile(r'^\d+\.?\s')
+
+# Structural indicators are packed into one bitmask per line instead of a dict per line
+INDICATOR_BITS = {
+    'is_short': 1 << 0,
+    'is_numbered': 1 << 1,
+    'is_uppercase': 1 << 2,
+    'is_title_case': 1 << 3,
+    'has_colon': 1 << 4,
+    'is_bold': 1 << 5,
+    'large_font': 1 << 6,
+    'very_large_font': 1 << 7,
+    'starts_sentence': 1 << 8,
+    'ends_period': 1 << 9,
+    'standalone_line': 1 << 10,
+}
+LONG_LINE_BIT = 1 << 11  # More than 15 words, only used for scoring
+
+def _score_for_bits(bits):
+    """Structure score for one combination of indicator bits"""
+    def has(name):
+        return bits & INDICATOR_BITS[name]
+    
+    structure_score = 0
+    
+    # High value indicators
+    if has('very_large_font'): structure_score += 10
+    if has('is_bold'): structure_score += 8
+    if has('large_font'): structure_score += 6
+    if has('is_numbered'): structure_score += 7
+    if has('is_uppercase') and has('is_short'): structure_score += 9
+    if has('is_title_case') and has('is_short'): structure_score += 5
+    
+    # Medium value indicators
+    if has('has_colon'): structure_score += 4
+    if has('standalone_line'): structure_score += 3
+    
+    # Negative indicators (likely body text)
+    if has('ends_period') and not has('is_short'): structure_score -= 3
+    if bits & LONG_LINE_BIT: structure_score -= 2  # Long lines likely body text
+    
+    return structure_score
+
+# Every bit combination scored once up front, so each line costs a single table lookup
+SCORE_BY_BITS = array('b', (_score_for_bits(bits) for bits in range(LONG_LINE_BIT << 1)))
 
 def debug_print(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
+# Content reports shared by every ContentAnalyzer in the process, oldest first. The MCP server
+# reaches it from several asyncio.to_thread workers at once, so every access holds the lock.
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def _report_cache_key(pdf_path, sample_ratio):
+    """Identify a report by file (path, modification time, size) and sample ratio"""
+    stat = os.stat(pdf_path)
+    return (os.path.realpath(pdf_path), stat.st_mtime_ns, stat.st_size, sample_ratio)
+
+@lru_cache(maxsize=32)
+def _content_hash(real_path, mtime_ns, size):
+    """SHA256 of a file's bytes, hashed again only when its modification time or size changes"""
+    digest = hashlib.sha256()
+    with open(real_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_content_hash(pdf_path):
+    """SHA256 hex digest of a file's contents (cached until the file changes)"""
+    return _content_hash(*_report_cache_key(pdf_path, None)[:3])
+
+def _disk_report_path(cache_key):
+    """Where the report for cache_key is saved (None when the disk cache is disabled)"""
+    if not REPORT_CACHE_DIR:
+        return None
+    sample_ratio = cache_key[3]
+    name = f"{_content_hash(*cache_key[:3])}-v{ANALYZER_VERSION}-{sample_ratio}.json"
+    return os.path.join(REPORT_CACHE_DIR, name)
+
+def _report_from_json(report):
+    """Restore the page and level keys that JSON turned into strings"""
+    structural = report['structural_elements']
+    for key in ('heading_levels', 'heading_distribution'):
+        structural[key] = {int(number): value for number, value in structural[key].items()}
+    return report
+
+def _remember_report(cache_key, report):
+    with _report_cache_lock:
+        _report_cache[cache_key] = report
+        if len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+
+def cached_content_report(pdf_path, sample_ratio=0.3):
+    """Content report for pdf_path from the in-memory or disk cache, or None if not analyzed yet"""
+    cache_key = _report_cache_key(pdf_path, sample_ratio)
+    with _report_cache_lock:
+        report = _report_cache.get(cache_key)
+        if report is not None:
+            _report_cache.move_to_end(cache_key)
+            return report
+    
+    disk_path = _disk_report_path(cache_key)
+    if disk_path is None:
+        return None
+    try:
+        # JSON rather than pickle: loading a pickle runs code, and anyone able to write to
+        # the cache directory could then run it in the MCP server
+        with open(disk_path, 'rb') as f:
+            report = _report_from_json(json.load(f))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        debug_print(f"Ignoring unreadable cached report {disk_path}: {e}")
+        return None
+    
+    debug_print(f"Loaded cached content analysis from {disk_path}")
+    _remember_report(cache_key, report)
+    return report
+
+def _store_content_report(pdf_path, sample_ratio, report):
+    """Keep a fresh report in memory and, best effort, on disk"""
+    cache_key = _report_cache_key(pdf_path, sample_ratio)
+    _remember_report(cache_key, report)
+    
+    disk_path = _disk_report_path(cache_key)
+    if disk_path is None:
+        return
+    try:
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        # Written under a temporary name first (per thread, two threads may store the same
+        # report at once) so readers never see a partial file
+        temp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f)
+        os.replace(temp_path, disk_path)
+    except OSError as e:
+        debug_print(f"Could not write report cache {disk_path}: {e}")
+
+def get_content_report(pdf_path, sample_ratio=0.3):
+    """Content report for pdf_path, opening the PDF only if no cached report exists"""
+    report = cached_content_report(pdf_path, sample_ratio)
+    if report is None:
+        with ContentAnalyzer(pdf_path) as analyzer:
+            report = analyzer.analyze_content_structure(sample_ratio)
+    return report
+
+def count_headings_above(level_info, min_score):
+    """Number of headings at a level scoring at least min_score, by binary search"""
+    sorted_scores = level_info['sorted_scores']
+    return len(sorted_scores) - bisect_left(sorted_scores, min_score)
+
+def headings_above(level_info, min_score):
+    """Headings at a level scoring at least min_score, in report order, generated lazily"""
+    return (h for h in level_info['headings'] if h['structure_score'] >= min_score)
+
+def has_indicator(element, name):
+    """Check a structural indicator (a key of INDICATOR_BITS) on an element dict"""
+    return bool(element['indicator_bits'] & INDICATOR_BITS[name])
+
+def median_from_counts(sorted_values, counts, total):
+    """Median of a dataset given as sorted distinct values and their counts"""
+    lower_rank, upper_rank = (total - 1) // 2, total // 2
+    seen = 0
+    lower = None
+    for value in sorted_values:
+        seen += counts[value]
+        if lower is None and seen > lower_rank:
+            lower = value
+        if seen > upper_rank:
+            return (lower + value) / 2
+
+class TextElements:
+    """Analyzed lines stored column by column; only headings are turned into dicts"""
+    
+    def __init__(self):
+        self.texts = []
+        self.pages = array('i')
+        self.font_sizes = array('d')
+        self.font_names = []
+        self.scores = array('i')
+        self.indicator_bits = array('H')
+        self.bboxes = []
+        self.pages_with_text = 0  # Counted per page as rows are added, not rebuilt from the pages column
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def append(self, text, page_num, font_size, font_name, structure_score, bits, bbox):
+        self.texts.append(text)
+        self.pages.append(page_num)
+        self.font_sizes.append(font_size)
+        self.font_names.append(font_name)
+        self.scores.append(structure_score)
+        self.indicator_bits.append(bits)
+        self.bboxes.append(bbox)
+    
+    def extend(self, other):
+        """Append all rows of another TextElements, e.g. one returned by a worker process"""
+        self.texts.extend(other.texts)
+        self.pages.extend(other.pages)
+        self.font_sizes.extend(other.font_sizes)
+        self.font_names.extend(other.font_names)
+        self.scores.extend(other.scores)
+        self.indicator_bits.extend(other.indicator_bits)
+        self.bboxes.extend(other.bboxes)
+        self.pages_with_text += other.pages_with_text  # Workers get disjoint pages
+    
+    def element(self, i):
+        """Build the element dict used in reports for row i"""
+        bits = self.indicator_bits[i]
+        return {
+            'text': self.texts[i],
+            'page': self.pages[i],
+            'font_size': self.font_sizes[i],
+            'font_name': self.font_names[i],
+            'structure_score': self.scores[i],
+            'indicator_bits': bits,
+            'bbox': self.bboxes[i]
+        }
+
+def analyze_pages(doc, page_nums):
+    """Analyze the given pages of an open document
+    
+    Returns (font_sizes, font_usage, text_elements) for just those pages.
+    """
+    font_sizes = array(SPAN_SIZE_TYPECODE)
+    font_usage = defaultdict(int)
+    text_elements = TextElements()
+    
+    for page_num in page_nums:
+        try:
+            ContentAnalyzer._analyze_page(doc, page_num, font_sizes, font_usage, text_elements)
+        except Exception as e:
+            debug_print(f"Error analyzing page {page_num}: {e}")
+            continue
+    
+    return font_sizes, font_usage, text_elements
+
+def _analyze_pages_worker(pdf_path, page_nums):
+    """Process pool entry point: each worker opens its own copy of the document"""
+    doc = fitz.open(pdf_path)
+    try:
+        return analyze_pages(doc, page_nums)
+    finally:
+        doc.close()
+
 class ContentAnalyzer:
     def __init__(self, pdf_path):
         self.pdf_path = pdf_path
@@ -30,124 +300,173 @@ class ContentAnalyzer:
         self.layout_patterns = {}
         
     def analyze_content_structure(self, sample_ratio=0.3):
-        """Analyze document structure based on content formatting patterns"""
+        """Analyze document structure based on content formatting patterns
+        
+        Reports are cached per file for the whole process and on disk by file content, so
+        the print_* methods, the CLI and the AI validator can all ask for one without
+        re-parsing pages.
+        """
+        
+        report = cached_content_report(self.pdf_path, sample_ratio)
+        if report is not None:
+            debug_print("Using cached content analysis")
+            self.font_analysis = report['font_analysis']
+            self.structural_elements = report['structural_elements']
+            return report
         
         print(f"🔬 Analyzing content structure without TOC...")
         
         page_count = self.doc.page_count
-        # Sample pages for analysis (more than TOC diagnostic since no TOC to rely on)
-        if page_count <= 10:
-            pages_to_analyze = range(page_count)
+        # Sample pages for analysis (more than TOC diagnostic since no TOC to rely on).
+        # Samples are spread evenly from the first to the last page, so the tail of the
+        # document is covered too; short documents are analyzed in full.
+        sample_count = min(page_count, max(10, int(page_count * sample_ratio)))
+        if sample_count > 1:
+            pages_to_analyze = [i * (page_count - 1) // (sample_count - 1) for i in range(sample_count)]
         else:
-            sample_count = max(10, int(page_count * sample_ratio))
-            step = max(1, page_count // sample_count)
-            pages_to_analyze = range(0, page_count, step)
+            pages_to_analyze = list(range(page_count))
         
         debug_print(f"Analyzing {len(pages_to_analyze)} pages out of {page_count}")
         
-        # Collect structural elements
-        font_sizes = []
-        font_usage = defaultdict(int)
-        text_elements = []
-        
-        for page_num in pages_to_analyze:
-            try:
-                page = self.doc[page_num]
-                text_dict = page.get_text("dict")
-                
-                for block in text_dict.get("blocks", []):
-                    if "lines" in block:  # Text block
-                        for line in block["lines"]:
-                            line_text = ""
-                            line_fonts = []
-                            line_sizes = []
-                            
-                            for span in line.get("spans", []):
-                                font_name = span.get("font", "")
-                                font_size = span.get("size", 0)
-                                text = span.get("text", "").strip()
-                                
-                                if text:  # Only process non-empty text
-                                    line_text += text + " "
-                                    line_fonts.append(font_name)
-                                    line_sizes.append(font_size)
-                                    font_usage[font_name] += len(text)
-                                    font_sizes.append(font_size)
-                            
-                            if line_text.strip():
-                                # Analyze this line for structural significance
-                                element = self._analyze_text_element(
-                                    line_text.strip(), 
-                                    line_sizes, 
-                                    line_fonts, 
-                                    page_num,
-                                    block.get("bbox", [0,0,0,0])
-                                )
-                                if element:
-                                    text_elements.append(element)
-                                    
-            except Exception as e:
-                debug_print(f"Error analyzing page {page_num}: {e}")
-                continue
+        # Collect structural elements (span sizes kept as a flat float array, not boxed floats).
+        # Parallelism is process based only: PyMuPDF documents are not thread-safe and
+        # get_text holds the GIL, so a prefetch thread would neither be safe nor overlap work.
+        workers = min(os.cpu_count() or 1, len(pages_to_analyze) // PARALLEL_MIN_PAGES + 1)
+        if workers > 1:
+            font_sizes, font_usage, text_elements = self._analyze_pages_parallel(pages_to_analyze, workers)
+        else:
+            font_sizes, font_usage, text_elements = analyze_pages(self.doc, pages_to_analyze)
         
         # Analyze patterns
         self._analyze_font_patterns(font_sizes, font_usage)
         self._identify_structural_elements(text_elements)
         
-        return self._generate_content_report()
+        report = self._generate_content_report()
+        _store_content_report(self.pdf_path, sample_ratio, report)
+        return report
     
-    def _analyze_text_element(self, text, font_sizes, font_names, page_num, bbox):
-        """Analyze a single text element for structural significance"""
+    def _analyze_pages_parallel(self, pages_to_analyze, workers):
+        """Analyze pages across worker processes, one contiguous chunk of pages per worker"""
         
-        if not text or not font_sizes:
-            return None
+        chunk_size = -(-len(pages_to_analyze) // workers)
+        chunks = [pages_to_analyze[i:i + chunk_size] for i in range(0, len(pages_to_analyze), chunk_size)]
+        debug_print(f"Analyzing pages with {len(chunks)} worker processes")
         
-        avg_font_size = statistics.mean(font_sizes)
-        primary_font = max(set(font_names), key=font_names.count) if font_names else "Unknown"
-        
-        # Calculate structural indicators
-        indicators = {
-            'is_short': len(text.split()) <= 8,  # Short lines often headings
-            'is_numbered': bool(re.match(r'^\d+\.?\s', text)),  # Starts with number
-            'is_uppercase': text.isupper(),
-            'is_title_case': text.istitle(),
-            'has_colon': text.endswith(':'),
-            'is_bold': 'Bold' in primary_font or 'bold' in primary_font.lower(),
-            'large_font': avg_font_size > 12,  # Adjust threshold as needed
-            'very_large_font': avg_font_size > 16,
-            'starts_sentence': text[0].isupper() if text else False,
-            'ends_period': text.endswith('.'),
-            'standalone_line': len(text.split()) <= 3,  # Very short, likely header
-        }
+        font_sizes = array(SPAN_SIZE_TYPECODE)
+        font_usage = defaultdict(int)
+        text_elements = TextElements()
+        
+        # Results come back in chunk order, so rows keep the same order as a serial run
+        # Workers are spawned, not forked: the MCP server calls this from a worker thread while its
+        # event loop and OpenAI client threads run, and forking a multi-threaded process can deadlock
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as executor:
+            for chunk_sizes, chunk_usage, chunk_elements in executor.map(
+                    _analyze_pages_worker, [self.pdf_path] * len(chunks), chunks):
+                font_sizes.extend(chunk_sizes)
+                for font_name, chars in chunk_usage.items():
+                    font_usage[font_name] += chars
+                text_elements.extend(chunk_elements)
+        
+        return font_sizes, font_usage, text_elements
+    
+    @staticmethod
+    def _analyze_page(doc, page_num, font_sizes, font_usage, text_elements):
+        """Fold one page's spans into the running font stats and text element columns
         
-        # Calculate structure score
-        structure_score = 0
+        Kept separate so the page's text dict is released as soon as the page is done,
+        instead of staying alive while the next page is extracted.
+        """
         
-        # High value indicators
-        if indicators['very_large_font']: structure_score += 10
-        if indicators['is_bold']: structure_score += 8
-        if indicators['large_font']: structure_score += 6
-        if indicators['is_numbered']: structure_score += 7
-        if indicators['is_uppercase'] and indicators['is_short']: structure_score += 9
-        if indicators['is_title_case'] and indicators['is_short']: structure_score += 5
+        page = doc[page_num]
+        text_dict = page.get_text("dict", flags=TEXT_FLAGS)
         
-        # Medium value indicators
-        if indicators['has_colon']: structure_score += 4
-        if indicators['standalone_line']: structure_score += 3
+        # Looked up once per page rather than once per span or line
+        intern = sys.intern
+        add_size = font_sizes.append
+        analyze_line = ContentAnalyzer._analyze_text_element
+        add_element = text_elements.append
+        rows_before = len(text_elements)
         
-        # Negative indicators (likely body text)
-        if indicators['ends_period'] and not indicators['is_short']: structure_score -= 3
-        if len(text.split()) > 15: structure_score -= 2  # Long lines likely body text
+        for block in text_dict["blocks"]:
+            if "lines" not in block:  # Image block
+                continue
+            bbox = block.get("bbox", [0,0,0,0])
+            for line in block["lines"]:
+                line_parts = []
+                line_fonts = []
+                line_sizes = []
+                
+                for span in line["spans"]:
+                    font_name = intern(span["font"])  # One shared string per font for dict keys
+                    font_size = span["size"]
+                    text = span["text"].strip()
+                    
+                    if text:  # Only process non-empty text
+                        line_parts.append(text)
+                        line_fonts.append(font_name)
+                        line_sizes.append(font_size)
+                        font_usage[font_name] += len(text)
+                        add_size(font_size)
+                
+                if line_parts:
+                    # Spans are already stripped, so one join builds the line text
+                    line_text = " ".join(line_parts)
+                    # Analyze this line for structural significance
+                    element = analyze_line(line_text, line_sizes, line_fonts)
+                    if element:
+                        structure_score, avg_font_size, primary_font, bits = element
+                        add_element(
+                            line_text, page_num, avg_font_size, primary_font,
+                            structure_score, bits, bbox
+                        )
+        
+        if len(text_elements) > rows_before:
+            text_elements.pages_with_text += 1
+    
+    @staticmethod
+    def _analyze_text_element(text, font_sizes, font_names):
+        """Analyze a single text element for structural significance
         
-        return {
-            'text': text,
-            'page': page_num,
-            'font_size': avg_font_size,
-            'font_name': primary_font,
-            'structure_score': structure_score,
-            'indicators': indicators,
-            'bbox': bbox
-        }
+        Returns (structure_score, avg_font_size, primary_font, indicator_bits)
+        """
+        
+        if not text or not font_sizes:
+            return None
+        
+        word_count = len(text.split())
+        avg_font_size = statistics.fmean(font_sizes)
+        
+        # Paragraph-length lines are nearly always body text. When none of their spans use a
+        # bold font the primary font can't set the bold bit, so tallying the fonts is put off
+        # until the line turns out to score as a heading after all.
+        if (word_count > 20 or len(text) > 160) and not any('bold' in name.lower() for name in font_names):
+            primary_font = None
+        else:
+            primary_font = Counter(font_names).most_common(1)[0][0] if font_names else "Unknown"
+        
+        # Calculate structural indicators. isupper/istitle run in C and stop at the first
+        # character that rules them out, which for body text is usually the second one.
+        last_char = text[-1]
+        bits = 0
+        if word_count <= 8: bits |= INDICATOR_BITS['is_short']  # Short lines often headings
+        if NUMBERED_RE.match(text): bits |= INDICATOR_BITS['is_numbered']  # Starts with number
+        if text.isupper(): bits |= INDICATOR_BITS['is_uppercase']
+        if text.istitle(): bits |= INDICATOR_BITS['is_title_case']
+        if last_char == ':': bits |= INDICATOR_BITS['has_colon']
+        if primary_font and ('Bold' in primary_font or 'bold' in primary_font.lower()): bits |= INDICATOR_BITS['is_bold']
+        if avg_font_size > 12: bits |= INDICATOR_BITS['large_font']  # Adjust threshold as needed
+        if avg_font_size > 16: bits |= INDICATOR_BITS['very_large_font']
+        if text[0].isupper(): bits |= INDICATOR_BITS['starts_sentence']
+        if last_char == '.': bits |= INDICATOR_BITS['ends_period']
+        if word_count <= 3: bits |= INDICATOR_BITS['standalone_line']  # Very short, likely header
+        if word_count > 15: bits |= LONG_LINE_BIT
+        
+        structure_score = SCORE_BY_BITS[bits]
+        if primary_font is None:
+            # Only heading rows (score above 3) ever report their font
+            primary_font = Counter(font_names).most_common(1)[0][0] if structure_score > 3 else font_names[0]
+        
+        return structure_score, avg_font_size, primary_font, bits
     
     def _analyze_font_patterns(self, font_sizes, font_usage):
         """Analyze font usage patterns to understand document hierarchy"""
@@ -155,55 +474,71 @@ class ContentAnalyzer:
         if not font_sizes:
             return
         
+        # Every statistic is computed from the size histogram: a document has a few dozen
+        # distinct sizes but hundreds of thousands of spans, so nothing walks the spans twice.
+        count = len(font_sizes)
+        size_counts = Counter(font_sizes)
+        distinct_sizes = sorted(size_counts)
+        avg_size = math.fsum(size * n for size, n in size_counts.items()) / count
+        median_size = median_from_counts(distinct_sizes, size_counts, count)
+        size_std = math.sqrt(math.fsum(n * (size - avg_size) ** 2 for size, n in size_counts.items()) / (count - 1)) if count > 1 else 0
+        
         self.font_analysis = {
-            'avg_size': statistics.mean(font_sizes),
-            'median_size': statistics.median(font_sizes),
-            'size_range': (min(font_sizes), max(font_sizes)),
-            'size_std': statistics.stdev(font_sizes) if len(font_sizes) > 1 else 0,
-            'common_sizes': Counter(font_sizes).most_common(5),
-            'total_fonts': len(set(font_usage.keys())),
+            'avg_size': avg_size,
+            'median_size': median_size,
+            'size_range': (distinct_sizes[0], distinct_sizes[-1]),
+            'size_std': size_std,
+            'common_sizes': size_counts.most_common(5),
+            'total_fonts': len(font_usage),
             'primary_fonts': sorted(font_usage.items(), key=lambda x: x[1], reverse=True)[:5]
         }
         
         # Determine likely heading sizes
-        size_counts = Counter(font_sizes)
-        all_sizes = sorted(set(font_sizes), reverse=True)
+        all_sizes = distinct_sizes[::-1]
         
         # Heading sizes are typically larger and less frequent
         self.font_analysis['likely_heading_sizes'] = []
         for size in all_sizes:
             if size > self.font_analysis['median_size'] + 2:  # Significantly larger
-                frequency = size_counts[size] / len(font_sizes)
+                frequency = size_counts[size] / count
                 if frequency < 0.1:  # Less than 10% of document
                     self.font_analysis['likely_heading_sizes'].append((size, frequency))
     
     def _identify_structural_elements(self, text_elements):
         """Identify potential section breaks and headings at multiple levels"""
         
-        # Sort by structure score
-        all_headings = [elem for elem in text_elements if elem['structure_score'] > 3]  # Lower threshold
-        all_headings.sort(key=lambda x: x['structure_score'], reverse=True)
-        
-        # Group headings by font size to identify hierarchy levels
+        # Filter on the score column, then build dicts only for the headings
+        scores = text_elements.scores
+        pages = text_elements.pages
+        heading_rows = [i for i, score in enumerate(scores) if score > 3]  # Lower threshold
+        # Only the top 50 are reported in score order, so just those are ranked
+        top_rows = heapq.nlargest(50, heading_rows, key=scores.__getitem__)  # Increased from 20 to 50
+        # Each heading dict is built once and shared by the list, levels and page distribution
+        headings_by_row = {i: text_elements.element(i) for i in heading_rows}
+        all_headings = [headings_by_row[i] for i in heading_rows]
+        
+        # Group heading rows by font size to identify hierarchy levels
         size_groups = defaultdict(list)
-        for elem in all_headings:
+        for i in heading_rows:
             # Round font size to group similar sizes
-            rounded_size = round(elem['font_size'], 1)
-            size_groups[rounded_size].append(elem)
+            size_groups[round(text_elements.font_sizes[i], 1)].append(i)
         
         # Identify heading levels based on font size and frequency
         heading_levels = {}
         sorted_sizes = sorted(size_groups.keys(), reverse=True)  # Largest to smallest
         
         for level, size in enumerate(sorted_sizes, 1):
-            headings_at_size = size_groups[size]
+            rows_at_size = size_groups[size]
             # Filter out sizes with too few instances (likely not consistent headings)
-            if len(headings_at_size) >= 2 or size > self.font_analysis.get('median_size', 10) + 4:
+            if len(rows_at_size) >= 2 or size > self.font_analysis.get('median_size', 10) + 4:
+                rows_at_size.sort(key=lambda i: (pages[i], scores[i]), reverse=True)
                 heading_levels[level] = {
                     'font_size': size,
-                    'count': len(headings_at_size),
-                    'headings': sorted(headings_at_size, key=lambda x: (x['page'], x['structure_score']), reverse=True),
-                    'avg_score': statistics.mean([h['structure_score'] for h in headings_at_size])
+                    'count': len(rows_at_size),
+                    'headings': [headings_by_row[i] for i in rows_at_size],
+                    # Ascending, for count_headings_above
+                    'sorted_scores': sorted(scores[i] for i in rows_at_size),
+                    'avg_score': sum(scores[i] for i in rows_at_size) / len(rows_at_size)
                 }
         
         # Group by pages to understand distribution
@@ -213,10 +548,10 @@ class ContentAnalyzer:
         
         self.structural_elements = {
             'total_elements': len(text_elements),
-            'potential_headings': all_headings[:50],  # Increased from 20 to 50
+            'potential_headings': [headings_by_row[i] for i in top_rows],
             'heading_levels': heading_levels,
             'heading_distribution': dict(page_distribution),
-            'avg_headings_per_page': len(all_headings) / len(set(e['page'] for e in text_elements)) if text_elements else 0
+            'avg_headings_per_page': len(all_headings) / text_elements.pages_with_text if text_elements else 0
         }
     
     def _generate_content_report(self):
@@ -288,60 +623,65 @@ class ContentAnalyzer:
     
     def print_content_report(self, detailed=False):
         """Print content analysis report"""
+        self.render_content_report(self.analyze_content_structure(), detailed)
+    
+    def render_content_report(self, report, detailed=False, file=None):
+        """Format an analysis report (file defaults to stdout)
         
-        print(f"\n🔬 Content Structure Analysis: {Path(self.pdf_path).name}")
-        print("=" * 80)
+        Only formats, so a report that was already built can be printed without re-analyzing.
+        """
         
-        report = self.analyze_content_structure()
+        print(f"\n🔬 Content Structure Analysis: {Path(self.pdf_path).name}", file=file)
+        print("=" * 80, file=file)
         
         # Document overview
-        print(f"📊 Document Overview:")
-        print(f"   Total Pages: {report['document_pages']}")
-        print(f"   Analysis Method: Content-based (no TOC required)")
+        print(f"📊 Document Overview:", file=file)
+        print(f"   Total Pages: {report['document_pages']}", file=file)
+        print(f"   Analysis Method: Content-based (no TOC required)", file=file)
         
         # Structure quality assessment
         quality = report['content_structure_quality']
-        print(f"\n📋 Structure Quality Assessment:")
-        print(f"   {quality['assessment']}")
-        print(f"   Quality Score: {quality['score']}/100")
+        print(f"\n📋 Structure Quality Assessment:", file=file)
+        print(f"   {quality['assessment']}", file=file)
+        print(f"   Quality Score: {quality['score']}/100", file=file)
         for note in quality['notes']:
-            print(f"   {note}")
+            print(f"   {note}", file=file)
         
         # Font analysis summary
         font = report['font_analysis']
-        print(f"\n🔤 Font Structure Analysis:")
-        print(f"   📊 Total Fonts: {font.get('total_fonts', 0)}")
-        print(f"   📏 Size Range: {font['size_range'][0]:.1f}pt - {font['size_range'][1]:.1f}pt")
-        print(f"   📐 Average Size: {font['avg_size']:.1f}pt")
+        print(f"\n🔤 Font Structure Analysis:", file=file)
+        print(f"   📊 Total Fonts: {font.get('total_fonts', 0)}", file=file)
+        print(f"   📏 Size Range: {font['size_range'][0]:.1f}pt - {font['size_range'][1]:.1f}pt", file=file)
+        print(f"   📐 Average Size: {font['avg_size']:.1f}pt", file=file)
         
         # Structural elements
         struct = report['structural_elements']
-        print(f"\n🏗️ Structural Elements:")
-        print(f"   📋 Total Potential Headings: {len(struct['potential_headings'])}")
-        print(f"   📊 Avg Headings/Page: {struct['avg_headings_per_page']:.1f}")
+        print(f"\n🏗️ Structural Elements:", file=file)
+        print(f"   📋 Total Potential Headings: {len(struct['potential_headings'])}", file=file)
+        print(f"   📊 Avg Headings/Page: {struct['avg_headings_per_page']:.1f}", file=file)
         
         # Show heading levels
         if 'heading_levels' in struct and struct['heading_levels']:
-            print(f"\n📊 Detected Heading Levels:")
+            print(f"\n📊 Detected Heading Levels:", file=file)
             for level, info in struct['heading_levels'].items():
-                print(f"   Level {level}: {info['font_size']:.1f}pt font, {info['count']} headings (avg score: {info['avg_score']:.1f})")
+                print(f"   Level {level}: {info['font_size']:.1f}pt font, {info['count']} headings (avg score: {info['avg_score']:.1f})", file=file)
         
         if detailed and struct['potential_headings']:
-            print(f"\n🎯 Top Potential Section Headings (All Levels):")
+            print(f"\n🎯 Top Potential Section Headings (All Levels):", file=file)
             for i, heading in enumerate(struct['potential_headings'][:15], 1):  # Show more headings
-                print(f"   {i:2d}. \"{heading['text'][:50]}{'...' if len(heading['text']) > 50 else ''}\"")
-                print(f"       Page {heading['page']}, Score: {heading['structure_score']}, Font: {heading['font_size']:.1f}pt")
+                print(f"   {i:2d}. \"{heading['text'][:50]}{'...' if len(heading['text']) > 50 else ''}\"", file=file)
+                print(f"       Page {heading['page']}, Score: {heading['structure_score']}, Font: {heading['font_size']:.1f}pt", file=file)
             
             # Show headings by level if user wants to see specific levels
             if 'heading_levels' in struct:
-                print(f"\n🔍 Headings by Level:")
+                print(f"\n🔍 Headings by Level:", file=file)
                 for level, info in list(struct['heading_levels'].items())[:3]:  # Top 3 levels
-                    print(f"   📋 Level {level} ({info['font_size']:.1f}pt):")
+                    print(f"   📋 Level {level} ({info['font_size']:.1f}pt):", file=file)
                     for i, heading in enumerate(info['headings'][:5], 1):  # Top 5 per level
-                        print(f"      {i}. \"{heading['text'][:60]}{'...' if len(heading['text']) > 60 else ''}\"")
+                        print(f"      {i}. \"{heading['text'][:60]}{'...' if len(heading['text']) > 60 else ''}\"", file=file)
         
         # Recommendations
-        self._print_content_recommendations(report)
+        self._print_content_recommendations(report, file)
     
     def print_level_analysis(self, target_level, min_score=3.0, detailed=False):
         """Print analysis focused on a specific heading level"""
@@ -349,7 +689,7 @@ class ContentAnalyzer:
         print(f"\n🎯 Level {target_level} Analysis: {Path(self.pdf_path).name}")
         print("=" * 80)
         
-        report = self.analyze_content_structure()
+        report = self.analyze_content_structure()  # Cached after the first call
         struct = report['structural_elements']
         
         if 'heading_levels' not in struct or target_level not in struct['heading_levels']:
@@ -380,10 +720,10 @@ class ContentAnalyzer:
             print(f"\n📋 All Level {target_level} Headings:")
             for i, heading in enumerate(filtered_headings, 1):
                 indicators = []
-                if heading['indicators'].get('is_bold'): indicators.append("Bold")
-                if heading['indicators'].get('is_title_case'): indicators.append("TitleCase")
-                if heading['indicators'].get('is_numbered'): indicators.append("Numbered")
-                if heading['indicators'].get('has_colon'): indicators.append("Colon")
+                if has_indicator(heading, 'is_bold'): indicators.append("Bold")
+                if has_indicator(heading, 'is_title_case'): indicators.append("TitleCase")
+                if has_indicator(heading, 'is_numbered'): indicators.append("Numbered")
+                if has_indicator(heading, 'has_colon'): indicators.append("Colon")
                 
                 indicator_str = f" [{', '.join(indicators)}]" if indicators else ""
                 print(f"   {i:3d}. \"{heading['text']}\"")
@@ -408,34 +748,34 @@ class ContentAnalyzer:
             print(f"   • Consider adjusting --min-score threshold")
             print(f"   • Or try a different level")
     
-    def _print_content_recommendations(self, report):
+    def _print_content_recommendations(self, report, file=None):
         """Print recommendations for content extraction"""
         
-        print(f"\n💡 Content Extraction Recommendations:")
-        print("-" * 50)
+        print(f"\n💡 Content Extraction Recommendations:", file=file)
+        print("-" * 50, file=file)
         
         quality_score = report['content_structure_quality']['score']
         
         if quality_score >= 40:
-            print(f"✅ Content-based extraction feasible")
-            print(f"   • Font size patterns can identify section breaks")
-            print(f"   • Look for elements with font size > {report['font_analysis']['median_size'] + 2:.1f}pt")
+            print(f"✅ Content-based extraction feasible", file=file)
+            print(f"   • Font size patterns can identify section breaks", file=file)
+            print(f"   • Look for elements with font size > {report['font_analysis']['median_size'] + 2:.1f}pt", file=file)
             
             # Identify potential extraction patterns
             headings = report['structural_elements']['potential_headings']
             if headings:
                 common_patterns = self._identify_heading_patterns(headings)
                 if common_patterns:
-                    print(f"   • Detected patterns: {', '.join(common_patterns)}")
+                    print(f"   • Detected patterns: {', '.join(common_patterns)}", file=file)
         else:
-            print(f"⚠️ Limited structure for automatic extraction")
-            print(f"   • Consider manual section identification")
-            print(f"   • May need page-based splitting instead")
-        
-        print(f"\n🛠️ Alternative Approaches:")
-        print(f"   • Use font size analysis for section detection")
-        print(f"   • Apply pattern matching for numbered sections")
-        print(f"   • Consider hybrid manual + automated approach")
+            print(f"⚠️ Limited structure for automatic extraction", file=file)
+            print(f"   • Consider manual section identification", file=file)
+            print(f"   • May need page-based splitting instead", file=file)
+        
+        print(f"\n🛠️ Alternative Approaches:", file=file)
+        print(f"   • Use font size analysis for section detection", file=file)
+        print(f"   • Apply pattern matching for numbered sections", file=file)
+        print(f"   • Consider hybrid manual + automated approach", file=file)
     
     def _identify_heading_patterns(self, headings):
         """Identify common patterns in potential headings"""
@@ -443,17 +783,17 @@ class ContentAnalyzer:
         patterns = []
         
         # Check for numbering patterns
-        numbered = [h for h in headings if h['indicators']['is_numbered']]
+        numbered = [h for h in headings if has_indicator(h, 'is_numbered')]
         if len(numbered) > 3:
             patterns.append("Numbered sections")
         
         # Check for title case patterns
-        title_case = [h for h in headings if h['indicators']['is_title_case']]
+        title_case = [h for h in headings if has_indicator(h, 'is_title_case')]
         if len(title_case) > len(headings) * 0.6:
             patterns.append("Title case headings")
         
         # Check for bold patterns
-        bold = [h for h in headings if h['indicators']['is_bold']]
+        bold = [h for h in headings if has_indicator(h, 'is_bold')]
         if len(bold) > len(headings) * 0.5:
             patterns.append("Bold formatting")
         
@@ -468,21 +808,60 @@ class ContentAnalyzer:
         """Close the PDF document"""
         if hasattr(self, 'doc'):
             self.doc.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 # =============================================================================
 # AI Integration Functions
 # =============================================================================
 
-def run_ai_validation(pdf_path: str, level: int, context: str = "general") -> dict:
-    """Run AI validation using the MCP server"""
+@lru_cache(maxsize=1)
+def _load_ai_validate():
+    """Import the MCP server's validator on first use and keep it (None if unavailable)
+    
+    Not imported at module level: pdf_structure_mcp_server imports this module and
+    pulls in openai/mcp, which plain content analysis doesn't need.
+    """
     try:
         from pdf_structure_mcp_server import run_ai_validation as ai_validate
-        return asyncio.run(ai_validate(pdf_path, level, context))
     except ImportError:
+        return None
+    return ai_validate
+
+@lru_cache(maxsize=1)
+def _ai_event_loop():
+    """One event loop for every AI call in this process, instead of a new one per asyncio.run()"""
+    import asyncio  # only needed once an AI call is made
+    loop = asyncio.new_event_loop()
+    atexit.register(loop.close)
+    return loop
+
+# Successful AI results by (pdf_path, level, context); errors aren't kept so they can be retried
+_ai_results = {}
+
+def _cached_ai_validate(ai_validate, pdf_path, level, context):
+    key = (pdf_path, level, context)
+    if key not in _ai_results:
+        result = _ai_event_loop().run_until_complete(ai_validate(pdf_path, level, context))
+        if "error" in result:
+            return result
+        _ai_results[key] = result
+    return _ai_results[key]
+
+def run_ai_validation(pdf_path: str, level: int, context: str = "general") -> dict:
+    """Run AI validation using the MCP server"""
+    ai_validate = _load_ai_validate()
+    if ai_validate is None:
         return {
             "error": "AI validation requires pdf_structure_mcp_server.py",
             "suggestion": "Ensure MCP server dependencies are installed"
         }
+    try:
+        return _cached_ai_validate(ai_validate, pdf_path, level, context)
     except Exception as e:
         return {
             "error": f"AI validation failed: {str(e)}",
@@ -491,14 +870,14 @@ def run_ai_validation(pdf_path: str, level: int, context: str = "general") -> di
 
 def run_ai_auto_level(pdf_path: str, context: str = "general") -> dict:
     """Run AI auto-level detection using the MCP server"""
-    try:
-        from pdf_structure_mcp_server import run_ai_validation as ai_validate
-        return asyncio.run(ai_validate(pdf_path, None, context))
-    except ImportError:
+    ai_validate = _load_ai_validate()
+    if ai_validate is None:
         return {
             "error": "AI auto-level requires pdf_structure_mcp_server.py",
             "suggestion": "Ensure MCP server dependencies are installed"
         }
+    try:
+        return _cached_ai_validate(ai_validate, pdf_path, None, context)
     except Exception as e:
         return {
             "error": f"AI auto-level detection failed: {str(e)}",
@@ -613,42 +992,40 @@ Examples:
         return 1
     
     try:
-        analyzer = ContentAnalyzer(args.input_pdf)
-        
-        # AI-powered analysis
-        if args.ask_ai:
-            if args.auto_level:
-                # Auto-find optimal level with AI
-                print("🤖 Using AI to find optimal extraction level...")
-                result = run_ai_auto_level(args.input_pdf, args.context)
-                print_ai_result(result, "Auto Level Detection")
-            elif args.level:
-                # Validate specific level with AI
-                print(f"🤖 Using AI to validate Level {args.level}...")
-                result = run_ai_validation(args.input_pdf, args.level, args.context)
-                print_ai_result(result, f"Level {args.level} Validation")
-            else:
-                # Run standard analysis first, then ask for AI validation of best level
-                report = analyzer.analyze_content_structure()
-                if 'heading_levels' in report['structural_elements'] and report['structural_elements']['heading_levels']:
-                    # Find best level by score
-                    levels = report['structural_elements']['heading_levels']
-                    best_level = max(levels.keys(), key=lambda k: levels[k]['avg_score'])
-                    print(f"🤖 Using AI to validate best detected level ({best_level})...")
-                    result = run_ai_validation(args.input_pdf, best_level, args.context)
-                    print_ai_result(result, f"Best Level ({best_level}) Validation")
+        with ContentAnalyzer(args.input_pdf) as analyzer:
+            # AI-powered analysis
+            if args.ask_ai:
+                if args.auto_level:
+                    # Auto-find optimal level with AI
+                    print("🤖 Using AI to find optimal extraction level...")
+                    result = run_ai_auto_level(args.input_pdf, args.context)
+                    print_ai_result(result, "Auto Level Detection")
+                elif args.level:
+                    # Validate specific level with AI
+                    print(f"🤖 Using AI to validate Level {args.level}...")
+                    result = run_ai_validation(args.input_pdf, args.level, args.context)
+                    print_ai_result(result, f"Level {args.level} Validation")
                 else:
-                    print("❌ No heading levels detected for AI analysis")
-        
-        # Standard analysis (always run unless auto-level with AI found optimal)
-        if not args.ask_ai or not args.auto_level:
-            if args.level:
-                # Show specific level analysis
-                analyzer.print_level_analysis(args.level, args.min_score, detailed=args.detailed)
-            else:
-                analyzer.print_content_report(detailed=args.detailed)
+                    # Run standard analysis first, then ask for AI validation of best level
+                    report = analyzer.analyze_content_structure()
+                    if 'heading_levels' in report['structural_elements'] and report['structural_elements']['heading_levels']:
+                        # Find best level by score
+                        levels = report['structural_elements']['heading_levels']
+                        best_level = max(levels.keys(), key=lambda k: levels[k]['avg_score'])
+                        print(f"🤖 Using AI to validate best detected level ({best_level})...")
+                        result = run_ai_validation(args.input_pdf, best_level, args.context)
+                        print_ai_result(result, f"Best Level ({best_level}) Validation")
+                    else:
+                        print("❌ No heading levels detected for AI analysis")
             
-        analyzer.close()
+            # Standard analysis (always run unless auto-level with AI found optimal)
+            if not args.ask_ai or not args.auto_level:
+                if args.level:
+                    # Show specific level analysis
+                    analyzer.print_level_analysis(args.level, args.min_score, detailed=args.detailed)
+                else:
+                    analyzer.print_content_report(detailed=args.detailed)
+        
         return 0
         
     except Exception as e:
@@ -5,33 +5,109 @@ Uses diagnostic analysis to recommend optimal extraction strategies
 """
 
 import os
-import fitz  # PyMuPDF
 import argparse
 import re
+import string
+import multiprocessing
+import multiprocessing.util
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 import sys
 
-# Import our diagnostic analyzer
-try:
-    from toc_diagnostic import TOCAnalyzer
-except ImportError:
-    print("❌ Error: toc_diagnostic.py not found. Make sure it's in the same directory.")
-    sys.exit(1)
+# PyMuPDF (fitz) and the diagnostic analyzer, which imports it too, are loaded on first use
+# so --help and the filename helpers don't pay for importing PyMuPDF.
+@lru_cache(maxsize=1)
+def _load_toc_analyzer():
+    """Import our diagnostic analyzer"""
+    try:
+        from toc_diagnostic import TOCAnalyzer
+    except ImportError:
+        print("❌ Error: toc_diagnostic.py not found. Make sure it's in the same directory.")
+        sys.exit(1)
+    return TOCAnalyzer
 
 # Configuration
 DEBUG = False
 
+# Built once, used for every chapter filename. Every ASCII byte other than letters,
+# digits, space, '_' and '-' is deleted from titles.
+SAFE_FILENAME_CHARS = frozenset(string.ascii_letters + string.digits + " _-")
+UNSAFE_FILENAME_BYTES = bytes(c for c in range(128) if chr(c) not in SAFE_FILENAME_CHARS)
+REPEATED_UNDERSCORES_RE = re.compile(r'_+')
+# Spaces and dashes in the default filename prefix become underscores
+PREFIX_SEPARATORS = str.maketrans({' ': '_', '-': '_'})
+
 def debug_print(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
+# Save options for chapter PDFs: compressed streams, deduplicated objects, cleaned content.
+# Smaller files at the cost of save time; --no-compress/--fast skips them (garbage=0, clean=False).
+COMPRESSED_SAVE_OPTIONS = dict(garbage=4, clean=True, deflate=True, deflate_images=True, deflate_fonts=True)
+
+def render_chapter_pdf(source_doc, start_page, end_page, compress=True):
+    """Build pages start_page-end_page (1-based, inclusive) of source_doc as PDF bytes"""
+    # One insert_pdf call for the whole range, so shared objects (fonts, images) are copied once.
+    # Reopening the source and calling select() instead would re-parse the whole file for
+    # every chapter, and the save would then have to garbage-collect the dropped pages.
+    import fitz  # PyMuPDF
+    new_pdf = fitz.open()
+    try:
+        new_pdf.insert_pdf(source_doc, from_page=start_page - 1, to_page=end_page - 1)
+        return new_pdf.tobytes(**(COMPRESSED_SAVE_OPTIONS if compress else {}))
+    finally:
+        new_pdf.close()
+
+def write_bytes(output_path, data):
+    with open(output_path, 'wb') as f:
+        f.write(data)
+
+def write_chapter_pdf(source_doc, start_page, end_page, output_path, compress=True):
+    """Save pages start_page-end_page (1-based, inclusive) of source_doc as a new PDF"""
+    write_bytes(output_path, render_chapter_pdf(source_doc, start_page, end_page, compress))
+    return end_page - start_page + 1
+
+# Source document opened once per worker process, not once per chapter
+_worker_doc = None
+
+def _init_chapter_worker(pdf_path):
+    import fitz  # PyMuPDF
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+    # Pool workers leave through os._exit, which skips atexit, so the document is closed
+    # by a multiprocessing finalizer instead, run when the worker shuts down
+    multiprocessing.util.Finalize(None, _worker_doc.close, exitpriority=10)
+
+def _write_chapter_worker(start_page, end_page, output_path, compress):
+    return write_chapter_pdf(_worker_doc, start_page, end_page, output_path, compress)
+
 class DocumentSplitter:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, analyzer=None):
         self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
-        self.toc = self.doc.get_toc(simple=False)
-        self.analyzer = TOCAnalyzer(pdf_path)
+        # Share the analyzer's parsed document and TOC instead of opening the PDF twice.
+        # A caller-supplied analyzer (with its cached analysis) stays owned by the caller.
+        # With a single open there is nothing left to overlap, so no thread pool here (and
+        # PyMuPDF holds the GIL while parsing, so threads wouldn't overlap it anyway).
+        self._owns_analyzer = analyzer is None
+        self.analyzer = analyzer or _load_toc_analyzer()(pdf_path)
+        self.doc = self.analyzer.doc
+        self.toc = self.analyzer.toc
+        
+        # (title, start_page) of every TOC entry, grouped by level in one pass, so each
+        # level's chapters are built from its own entries instead of rescanning the TOC.
+        # The same pass counts well-formed entries for validation (PyMuPDF gives plain ints,
+        # so an exact type check is enough).
+        self._by_level = defaultdict(list)
+        self._valid_toc_entries = 0
+        for entry in self.toc:
+            if len(entry) >= 3:
+                level, title, start_page = entry[0], entry[1], entry[2]
+                self._by_level[level].append((title, start_page))
+                if type(level) is int and type(start_page) is int:
+                    self._valid_toc_entries += 1
+        self._chapters_cache = {}
         
         # Validate document structure before proceeding
         self._validate_document_structure()
@@ -57,16 +133,14 @@ class DocumentSplitter:
                 "   This tool is designed for well-structured documents with multiple chapters/sections."
             )
         
-        # Check 3: Are TOC entries properly formatted?
-        valid_entries = 0
-        for entry in self.toc:
-            if len(entry) >= 3 and isinstance(entry[0], int) and isinstance(entry[2], int):
-                valid_entries += 1
+        # Check 3: Are TOC entries properly formatted? (counted while indexing the TOC)
+        toc_count = len(self.toc)
+        valid_entries = self._valid_toc_entries
         
-        if valid_entries < len(self.toc) * 0.8:  # At least 80% valid entries
+        if valid_entries < toc_count * 0.8:  # At least 80% valid entries
             raise ValueError(
                 "❌ Document Validation Failed: Malformed TOC structure.\n"
-                f"   Only {valid_entries}/{len(self.toc)} TOC entries are properly formatted.\n"
+                f"   Only {valid_entries}/{toc_count} TOC entries are properly formatted.\n"
                 "   This suggests the document may not have proper heading structure."
             )
         
@@ -110,24 +184,12 @@ class DocumentSplitter:
         
     def get_chapters_at_level(self, level):
         """Extract chapters at a specific TOC level"""
-        chapters = []
+        if level in self._chapters_cache:
+            return list(self._chapters_cache[level])
         
-        if not self.toc:
-            return chapters
+        chapters = []
         
-        # Get entries at the specified level
-        level_entries = []
-        for entry in self.toc:
-            if len(entry) >= 3 and entry[0] == level:
-                level_entries.append((entry[1], entry[2]))  # title, page
-        
-        # Calculate page ranges
-        for i, (title, start_page) in enumerate(level_entries):
-            end_page = self.doc.page_count
-            if i + 1 < len(level_entries):
-                _, next_start = level_entries[i + 1]
-                end_page = next_start - 1
-            
+        def add_chapter(title, start_page, end_page):
             # Handle edge case: if start_page > end_page (same-page chapters)
             # Default to including the full page
             if start_page > end_page:
@@ -141,55 +203,83 @@ class DocumentSplitter:
                 'page_count': end_page - start_page + 1
             })
         
-        return chapters
+        # Each entry at the level closes the previous chapter one page before it starts
+        pending = None  # (title, start_page) of the chapter still waiting for its end
+        for title, start_page in self._by_level.get(level, []):
+            if pending:
+                add_chapter(*pending, start_page - 1)
+            pending = (title, start_page)
+        
+        # The last chapter runs to the end of the document
+        if pending:
+            add_chapter(*pending, self.doc.page_count)
+        
+        self._chapters_cache[level] = chapters
+        return list(chapters)
     
     def sanitize_filename(self, name):
         """Clean filename for safe file system usage"""
-        safe = re.sub(r"[^0-9a-zA-Z _-]", "", name)
+        # Non-ASCII characters are dropped by the encode, the rest of the unsafe ones by translate
+        safe = name.encode('ascii', 'ignore').translate(None, UNSAFE_FILENAME_BYTES).decode('ascii')
         safe = safe.strip().replace(' ', '_').lower()
-        safe = re.sub(r'_+', '_', safe)
+        safe = REPEATED_UNDERSCORES_RE.sub('_', safe)
         return safe.strip('_')
     
-    def split_to_pdf(self, chapters, output_dir, prefix):
-        """Split document into PDF chapters"""
+    def split_to_pdf(self, chapters, output_dir, prefix, jobs=1, compress=True):
+        """Split document into PDF chapters, using up to `jobs` worker processes"""
         print(f"\n📄 Creating PDF chapters...")
         
+        # Work out every chapter's file and page range first, then write them. The listing
+        # is printed in one go rather than two or three print() calls per chapter.
+        writes = []
+        listing = []
+        out = Path(output_dir)
         for i, chapter in enumerate(chapters, 1):
-            # Create filename with numerical prefix for order
-            sanitized_title = self.sanitize_filename(chapter['title'])
-            filename = f"{prefix}_{i:02d}_{sanitized_title}.pdf"
-            output_path = os.path.join(output_dir, filename)
-            
-            print(f"   📖 Chapter {i:2d}: {chapter['title']}")
-            print(f"        Pages {chapter['start_page']:3d}-{chapter['end_page']:3d} → {filename}")
-            
-            # Validate page range
+            # Validate page range first; skipped chapters need no filename
             start_page = max(1, chapter['start_page'])
             end_page = min(self.doc.page_count, chapter['end_page'])
             
             if start_page > end_page:
-                print(f"        ⚠️  Warning: Invalid page range, skipping chapter")
+                listing.append(f"   ⚠️  Chapter {i:2d}: {chapter['title']} - invalid page range, skipping")
                 continue
             
-            # Create new PDF with the chapter pages
-            new_pdf = fitz.open()
-            pages_added = 0
-            
-            for page_num in range(start_page - 1, end_page):
-                if page_num < self.doc.page_count:
-                    new_pdf.insert_pdf(self.doc, from_page=page_num, to_page=page_num)
-                    pages_added += 1
-            
-            # Only save if we actually added pages
-            if pages_added > 0:
-                new_pdf.save(output_path)
-                debug_print(f"        ✅ Saved {pages_added} pages to {filename}")
-            else:
-                print(f"        ⚠️  Warning: No pages to save for {filename}")
-            
-            new_pdf.close()
+            # Create filename with numerical prefix for order
+            filename = f"{prefix}_{i:02d}_{self.sanitize_filename(chapter['title'])}.pdf"
+            listing.append(f"   📖 Chapter {i:2d}: {chapter['title']}\n"
+                           f"        Pages {chapter['start_page']:3d}-{chapter['end_page']:3d} → {filename}")
+            writes.append((start_page, end_page, str(out / filename)))
+        
+        if listing:
+            print("\n".join(listing))
         
-        print(f"✅ Created {len(chapters)} PDF chapters")
+        if jobs > 1 and len(writes) > 1:
+            # Chapters are independent, so each worker builds and compresses its own files
+            workers = min(jobs, len(writes))
+            debug_print(f"Writing {len(writes)} chapters with {workers} worker processes")
+            # Workers are spawned rather than forked, like the page analysis pools, so a
+            # caller with other threads running can't deadlock them
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_chapter_worker,
+                                     initargs=(self.pdf_path,),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = [executor.submit(_write_chapter_worker, *write, compress) for write in writes]
+                for (start_page, end_page, output_path), future in zip(writes, futures):
+                    future.result()
+                    debug_print(f"        ✅ Saved {end_page - start_page + 1} pages to {os.path.basename(output_path)}")
+        else:
+            # PyMuPDF isn't thread-safe, so chapters are built here one at a time while a
+            # writer thread puts the previous chapter on disk (file writes release the GIL)
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                pending = None
+                for start_page, end_page, output_path in writes:
+                    data = render_chapter_pdf(self.doc, start_page, end_page, compress)
+                    if pending:
+                        pending.result()  # at most one chapter's bytes waiting in memory
+                    pending = writer.submit(write_bytes, output_path, data)
+                    debug_print(f"        ✅ Saved {end_page - start_page + 1} pages to {os.path.basename(output_path)}")
+                if pending:
+                    pending.result()
+        
+        print(f"✅ Created {len(writes)} PDF chapters")
     
     def split_to_docx(self, chapters, output_dir, prefix):
         """Split document into DOCX chapters (placeholder for future Adobe integration)"""
@@ -198,7 +288,7 @@ class DocumentSplitter:
         print(f"   📄 For now, use PDF output and convert manually if needed")
         print(f"   📝 Filenames would follow pattern: {prefix}_01_chapter_title.docx")
     
-    def split_document(self, level, output_dir, prefix, output_formats):
+    def split_document(self, level, output_dir, prefix, output_formats, jobs=1, compress=True):
         """Main document splitting function"""
         
         # Ensure output directory exists
@@ -223,7 +313,7 @@ class DocumentSplitter:
         
         if 'pdf' in output_formats:
             try:
-                self.split_to_pdf(chapters, output_dir, prefix)
+                self.split_to_pdf(chapters, output_dir, prefix, jobs, compress)
             except Exception as e:
                 print(f"❌ Error creating PDF chapters: {e}")
                 success = False
@@ -238,11 +328,15 @@ class DocumentSplitter:
         return success
     
     def close(self):
-        """Close resources"""
-        if hasattr(self, 'doc'):
-            self.doc.close()
-        if hasattr(self, 'analyzer'):
+        """Close resources (the document belongs to the analyzer)"""
+        if hasattr(self, 'analyzer') and self._owns_analyzer:
             self.analyzer.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 def validate_document_structure(pdf_path):
     """Standalone function to validate document structure without creating a splitter"""
@@ -250,19 +344,18 @@ def validate_document_structure(pdf_path):
     print(f"🔍 Validating document: {Path(pdf_path).name}")
     
     try:
-        doc = fitz.open(pdf_path)
-        toc = doc.get_toc(simple=False)
-        
-        if not toc:
-            print("❌ No table of contents found")
-            return False
-        
-        if len(toc) < 2:
-            print(f"❌ Insufficient TOC entries: {len(toc)}")
-            return False
-        
-        analyzer = TOCAnalyzer(pdf_path)
-        analysis_data = analyzer.analyze_structure()
+        with _load_toc_analyzer()(pdf_path) as analyzer:
+            toc = analyzer.toc
+            
+            if not toc:
+                print("❌ No table of contents found")
+                return False
+            
+            if len(toc) < 2:
+                print(f"❌ Insufficient TOC entries: {len(toc)}")
+                return False
+            
+            analysis_data = analyzer.analyze_structure()
         
         if not analysis_data:
             print("❌ Could not analyze TOC structure")
@@ -274,22 +367,43 @@ def validate_document_structure(pdf_path):
         print(f"   📋 {len(toc)} TOC entries")
         print(f"   📊 Quality score: {best_score:.1f}/100")
         print(f"   🎯 Recommended level: {analysis_data['ranked_levels'][0][0]}")
-        
-        doc.close()
-        analyzer.close()
         return True
         
     except Exception as e:
         print(f"❌ Validation error: {str(e)}")
         return False
 
-def interactive_extraction(pdf_path):
-    """Interactive extraction with diagnostic guidance"""
+def plan_extraction(pdf_path, analysis_data=None, level=None, output_dir=None, prefix=None, output_formats=None):
+    """Resolve extraction settings, filling in defaults for anything not given
+    
+    Shared by batch and interactive mode; the level defaults to the analysis' recommended
+    level. Returns the keyword arguments for DocumentSplitter.split_document().
+    """
+    if level is None and analysis_data and analysis_data['ranked_levels']:
+        level = analysis_data['ranked_levels'][0][0]
+    
+    return {
+        'level': level,
+        'output_dir': output_dir or os.path.join(os.path.dirname(pdf_path), "extracted_chapters"),
+        'prefix': prefix or Path(pdf_path).stem.lower().translate(PREFIX_SEPARATORS),
+        'output_formats': output_formats or ['pdf'],
+    }
+
+def interactive_extraction(pdf_path, jobs=1, compress=True, overrides=None):
+    """Interactive extraction with diagnostic guidance
+    
+    overrides (plan_extraction keyword arguments) become the defaults offered at each prompt.
+    """
     
     print(f"\n🔍 Analyzing document structure...")
     
-    # Run diagnostic analysis
-    analyzer = TOCAnalyzer(pdf_path)
+    # Run diagnostic analysis. The analyzer stays open and is handed to the splitter,
+    # so the PDF is parsed and analyzed only once.
+    with _load_toc_analyzer()(pdf_path) as analyzer:
+        return _interactive_extraction(pdf_path, analyzer, jobs, compress, overrides or {})
+
+def _interactive_extraction(pdf_path, analyzer, jobs, compress, overrides):
+    """Body of interactive_extraction, run while the shared analyzer is open"""
     analysis_data = analyzer.analyze_structure()
     
     if not analysis_data:
@@ -310,35 +424,38 @@ def interactive_extraction(pdf_path):
         medal = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉"
         print(f"   {medal} Level {level}: {stats['count']} chapters, avg {stats['avg_page_range']:.1f} pages (score: {score:.1f})")
     
-    analyzer.close()
-    
-    # Get user choices
+    # Get user choices, starting from the same defaults batch mode would use
     print(f"\n🎯 Extraction Configuration:")
+    defaults = plan_extraction(pdf_path, analysis_data, **overrides)
     
     # Choose level
     recommended_level = analysis_data['ranked_levels'][0][0]
+    level_hint = f"recommended: {recommended_level}"
+    if defaults['level'] != recommended_level:
+        level_hint = f"default: {defaults['level']}, {level_hint}"
     while True:
-        level_input = input(f"   📊 Choose TOC level (recommended: {recommended_level}): ").strip()
+        level_input = input(f"   📊 Choose TOC level ({level_hint}): ").strip()
         if not level_input:
-            level = recommended_level
+            # The default may be a --level override, so it is checked like typed input
+            level = defaults['level']
+        else:
+            try:
+                level = int(level_input)
+            except ValueError:
+                print("   ❌ Please enter a valid number")
+                continue
+        if level in analysis_data['level_analysis']:
             break
-        try:
-            level = int(level_input)
-            if level in analysis_data['level_analysis']:
-                break
-            else:
-                print(f"   ❌ Level {level} not available. Available levels: {list(analysis_data['level_analysis'].keys())}")
-        except ValueError:
-            print("   ❌ Please enter a valid number")
+        print(f"   ❌ Level {level} not available. Available levels: {list(analysis_data['level_analysis'].keys())}")
     
     # Choose output directory
-    default_output = os.path.join(os.path.dirname(pdf_path), "extracted_chapters")
+    default_output = defaults['output_dir']
     output_dir = input(f"   📁 Output directory (default: {default_output}): ").strip()
     if not output_dir:
         output_dir = default_output
     
     # Choose prefix
-    default_prefix = Path(pdf_path).stem.lower().replace(' ', '_').replace('-', '_')
+    default_prefix = defaults['prefix']
     prefix = input(f"   🏷️  Filename prefix (default: {default_prefix}): ").strip()
     if not prefix:
         prefix = default_prefix
@@ -378,9 +495,9 @@ def interactive_extraction(pdf_path):
     
     # Perform extraction
     print(f"\n🚀 Starting extraction...")
-    splitter = DocumentSplitter(pdf_path)
-    success = splitter.split_document(level, output_dir, prefix, output_formats)
-    splitter.close()
+    plan = plan_extraction(pdf_path, analysis_data, level, output_dir, prefix, output_formats)
+    with DocumentSplitter(pdf_path, analyzer) as splitter:
+        success = splitter.split_document(**plan, jobs=jobs, compress=compress)
     
     if success:
         print(f"\n🎉 Extraction completed successfully!")
@@ -399,11 +516,13 @@ Examples:
   python pdf_splitter.py srd/SRD_CC_v5.2.1.pdf
   python pdf_splitter.py document.pdf --level 2 --output chapters/ --prefix doc
   python pdf_splitter.py report.pdf --batch --level 1 --format pdf
+  python pdf_splitter.py srd/SRD_CC_v5.2.1.pdf --batch --level 2 --jobs 4
         """
     )
     
     parser.add_argument('input_pdf', help='Path to PDF file to split')
-    parser.add_argument('--level', '-l', type=int, help='TOC level to use for splitting')
+    parser.add_argument('--level', '-l', type=int,
+                       help='TOC level to use for splitting (default: recommended level)')
     parser.add_argument('--output', '-o', help='Output directory')
     parser.add_argument('--prefix', '-p', help='Filename prefix for chapters')
     parser.add_argument('--format', '-f', choices=['pdf', 'docx', 'both'], 
@@ -412,9 +531,17 @@ Examples:
                        help='Batch mode (no interactive prompts)')
     parser.add_argument('--validate', '-v', action='store_true',
                        help='Only validate document structure (no extraction)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                       help='Worker processes for writing chapter PDFs (default: 1, 0 = all CPUs)')
+    parser.add_argument('--compress', action=argparse.BooleanOptionalAction, default=True,
+                       help='Compress and garbage-collect chapter PDFs on save (default: on)')
+    parser.add_argument('--fast', dest='compress', action='store_false',
+                       help='Fastest save: skip garbage collection, cleaning and compression (same as --no-compress)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     
     args = parser.parse_args()
+    if args.jobs < 1:
+        args.jobs = os.cpu_count() or 1
     
     # Set debug level
     global DEBUG
@@ -430,25 +557,26 @@ Examples:
             success = validate_document_structure(args.input_pdf)
             return 0 if success else 1
             
-        elif args.batch:
-            # Batch mode - use provided arguments or defaults
-            if not args.level:
-                print("❌ Error: --level required in batch mode")
-                return 1
-            
-            output_dir = args.output or os.path.join(os.path.dirname(args.input_pdf), "extracted_chapters")
-            prefix = args.prefix or Path(args.input_pdf).stem.lower().replace(' ', '_').replace('-', '_')
-            
-            output_formats = ['pdf', 'docx'] if args.format == 'both' else [args.format]
-            
-            splitter = DocumentSplitter(args.input_pdf)
-            success = splitter.split_document(args.level, output_dir, prefix, output_formats)
-            splitter.close()
+        # Settings given on the command line; anything missing falls back to plan_extraction defaults
+        overrides = {
+            'level': args.level,
+            'output_dir': args.output,
+            'prefix': args.prefix,
+            'output_formats': ['pdf', 'docx'] if args.format == 'both' else [args.format],
+        }
+        
+        if args.batch:
+            # Batch mode - use provided arguments or defaults (recommended level if --level is omitted).
+            # Nobody is waiting on each line, so let stdout coalesce writes even on a terminal.
+            sys.stdout.reconfigure(line_buffering=False)
+            with DocumentSplitter(args.input_pdf) as splitter:
+                plan = plan_extraction(args.input_pdf, splitter.analyzer.analyze_structure(), **overrides)
+                success = splitter.split_document(**plan, jobs=args.jobs, compress=args.compress)
             
             return 0 if success else 1
         else:
             # Interactive mode
-            success = interactive_extraction(args.input_pdf)
+            success = interactive_extraction(args.input_pdf, args.jobs, args.compress, overrides)
             return 0 if success else 1
             
     except Exception as e:
@@ -5,25 +5,37 @@ Provides AI-powered validation and extraction strategy for PDF documents using O
 """
 
 import asyncio
+import atexit
+import hashlib
 import json
 import os
-import tempfile
+import random
+import re
+import signal
+import sys
+import time
+from collections import Counter
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
+from functools import wraps
+from itertools import islice
 from typing import Dict, List, Optional
 
 import mcp.types as types
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
 from dotenv import load_dotenv
 
-from content_analyzer import ContentAnalyzer
+from content_analyzer import (get_content_report, file_content_hash,
+                              count_headings_above, headings_above)
 from pdf_structure_meta_schema import (
     get_openai_function_schema, 
-    validate_response,
-    ValidationResult,
-    ExtractionStrategy,
+    validate_response_json,
+    validate_response_many,
     StructureAnalysisInput,
+    StrategyInput,
+    LevelSummary,
     HeadingSample,
     HeadingData,
     FontAnalysis
@@ -35,17 +47,259 @@ load_dotenv()
 # Initialize MCP server
 server = Server("pdf-structure-analyzer")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("TRAINING_OPENAI_API_KEY"))
+# Initialize OpenAI client; async so API calls don't block other in-flight tool calls
+client = AsyncOpenAI(api_key=os.getenv("TRAINING_OPENAI_API_KEY"))
 
 # Configuration
 DEBUG = False
 MAX_SAMPLE_HEADINGS = 10
+UPLOAD_TTL_SECONDS = 30 * 60  # How long an uploaded PDF is reused before uploading it again
+BATCH_POLL_SECONDS = 60  # How often bulk_auto_find checks on its Batch API job
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+OPENAI_MODEL = "gpt-4o"
+# Levels with fewer or more headings than this are never sent for validation
+MIN_VIABLE_HEADINGS = 3
+MAX_VIABLE_HEADINGS = 500
+# Retry settings for transient OpenAI errors (rate limits, 5xx, timeouts, dropped connections)
+MAX_ATTEMPTS = 3
+RETRY_MIN_DELAY = 1
+RETRY_MAX_DELAY = 30
+TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+# Validated AI answers are kept here as JSON, keyed by what was asked (empty disables it)
+AI_CACHE_DIR = os.getenv("PDF_STRUCTURE_AI_CACHE_DIR", os.path.join(".cache", "pdf_structure_ai"))
 
 def debug_print(message: str):
     if DEBUG:
         print(f"[MCP-DEBUG] {message}")
 
+def retry_transient(func):
+    """Retry the coroutine func with exponential backoff when OpenAI returns a transient error
+    
+    A rate limit or timeout on one level would otherwise abort that level's validation and
+    throw away the local analysis done for it.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return await func(*args, **kwargs)
+            except TRANSIENT_ERRORS as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_MIN_DELAY * 2 ** (attempt - 1))
+                delay += random.uniform(0, delay / 2)
+                debug_print(f"{func.__name__} failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}, "
+                            f"retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    return wrapper
+
+@retry_transient
+async def _chat_create(**kwargs):
+    return await client.chat.completions.create(**kwargs)
+
+@retry_transient
+async def _upload_pdf(pdf_path: str):
+    # Opened per attempt so a retry uploads from the start of the file. The open file is
+    # handed over as is, so the multipart body streams from disk instead of being read into memory.
+    with open(pdf_path, "rb") as f:
+        return await client.files.create(file=(Path(pdf_path).name, f, "application/pdf"),
+                                          purpose="assistants")
+
+# Uploaded PDFs by content hash: {sha256: (file_id, uploaded_at)}. Files are shared by every
+# tool call for the same PDF. Once past UPLOAD_TTL_SECONDS a file is expired and deleted as
+# soon as no call is using it; the ones still current are deleted when the process exits.
+_uploaded_files = {}
+_file_users = Counter()  # file_id -> tool calls currently using that file
+_expired_file_ids = set()
+_upload_locks = {}  # sha256 -> asyncio.Lock held while that PDF is being uploaded
+
+async def _delete_file(file_id: str):
+    try:
+        await client.files.delete(file_id)
+        debug_print(f"Cleaned up file: {file_id}")
+    except Exception as e:
+        debug_print(f"Error cleaning up file: {e}")
+
+async def _delete_expired_files():
+    """Expire uploads past their TTL and delete every expired file no call is using"""
+    now = time.monotonic()
+    for digest, (file_id, uploaded_at) in list(_uploaded_files.items()):
+        if now - uploaded_at >= UPLOAD_TTL_SECONDS:
+            del _uploaded_files[digest]
+            _expired_file_ids.add(file_id)
+    # Expired files are no longer handed out, so nothing can start using these meanwhile
+    idle = [file_id for file_id in _expired_file_ids if not _file_users[file_id]]
+    for file_id in idle:
+        _expired_file_ids.discard(file_id)
+        await _delete_file(file_id)
+
+async def _get_or_upload_file(pdf_path: str) -> str:
+    """Return an OpenAI file id for pdf_path, uploading it only if there's no recent upload
+    
+    The file counts as in use by the caller until _release_file is called for it, use
+    uploaded_file() rather than calling this directly. Concurrent tool calls for the same
+    PDF wait for one upload instead of each making their own.
+    """
+    await _delete_expired_files()
+    digest = file_content_hash(pdf_path)
+    lock = _upload_locks.setdefault(digest, asyncio.Lock())
+    async with lock:
+        cached = _uploaded_files.get(digest)
+        if cached:
+            file_id, uploaded_at = cached
+            if time.monotonic() - uploaded_at < UPLOAD_TTL_SECONDS:
+                debug_print(f"Reusing uploaded PDF file ID: {file_id}")
+                _file_users[file_id] += 1
+                return file_id
+            # Calls still in flight may be using it, it's deleted once they are done
+            del _uploaded_files[digest]
+            _expired_file_ids.add(file_id)
+        
+        file = await _upload_pdf(pdf_path)
+        debug_print(f"Uploaded PDF with file ID: {file.id}")
+        _uploaded_files[digest] = (file.id, time.monotonic())
+        _file_users[file.id] += 1
+        return file.id
+
+async def _release_file(file_id: str):
+    """Mark one use of file_id as done, deleting it if it expired and this was the last one"""
+    _file_users[file_id] -= 1
+    if _file_users[file_id] <= 0:
+        del _file_users[file_id]
+    await _delete_expired_files()
+
+@asynccontextmanager
+async def uploaded_file(pdf_path: str):
+    """OpenAI file id for pdf_path, kept from being deleted until the block exits"""
+    file_id = await _get_or_upload_file(pdf_path)
+    try:
+        yield file_id
+    finally:
+        await _release_file(file_id)
+
+@atexit.register
+def _delete_uploaded_files():
+    """Clean up every PDF uploaded by this process"""
+    file_ids = [file_id for file_id, _ in _uploaded_files.values()] + list(_expired_file_ids)
+    _uploaded_files.clear()
+    _expired_file_ids.clear()
+    if not file_ids:
+        return
+    # The event loop is gone by exit time, so cleanup uses a short-lived sync client
+    cleanup_client = OpenAI(api_key=os.getenv("TRAINING_OPENAI_API_KEY"))
+    for file_id in file_ids:
+        try:
+            cleanup_client.files.delete(file_id)
+            debug_print(f"Cleaned up file: {file_id}")
+        except Exception as e:
+            debug_print(f"Error cleaning up file: {e}")
+
+# Instructions that are the same for every call, sent as the system message ahead of the
+# per-document data so repeated calls share a cacheable prompt prefix
+VALIDATION_SYSTEM_PROMPT = """
+Analyze a PDF document structure to validate if the extracted headings represent meaningful content sections.
+
+The user message gives the document context and the structure data extracted at one heading level.
+Please examine the actual PDF content and compare it with the extracted structure data.
+
+Key validation criteria:
+1. Do the sample headings represent logical document sections?
+2. Are they consistent in formatting and purpose?
+3. Would extraction at this level produce meaningful, usable content?
+4. Are there better levels that should be tried instead?
+
+Consider the document context given by the user.
+"""
+
+MULTI_VALIDATION_SYSTEM_PROMPT = """
+Analyze a PDF document structure to decide which heading level gives meaningful content sections.
+
+The user message gives the document context and the structure data extracted at several candidate heading levels.
+Please examine the actual PDF content and compare it with the extracted structure data.
+
+For each candidate level, consider:
+1. Do the sample headings represent logical document sections?
+2. Are they consistent in formatting and purpose?
+3. Would extraction at this level produce meaningful, usable content?
+
+Return exactly one result per candidate level, with its level number.
+Consider the document context given by the user.
+"""
+
+STRATEGY_SYSTEM_PROMPT = """
+Provide detailed extraction strategy for a validated PDF structure.
+
+The user message gives the document, the validated heading level, the document context and the structure data.
+Based on your analysis of the actual PDF content and the structure data, provide:
+
+1. **Primary Strategy**: The best approach for extraction
+2. **Implementation Details**: Specific parameters and thresholds
+3. **Potential Challenges**: What could go wrong and how to handle it
+4. **Fallback Strategies**: Alternative approaches if primary fails
+5. **Expected Output**: What the user can expect from extraction
+
+Consider the document context when making recommendations.
+Focus on practical, actionable advice for successful content extraction.
+"""
+
+# Validated AI answers (pydantic models) already fetched or loaded by this process, by ai_cache_key()
+_ai_answers = {}
+
+def ai_cache_key(schema_name: str, payload: dict, context: str) -> str:
+    """Canonical key for an AI request: model, response schema, the structure data and context
+    
+    The context is lowercased with punctuation and extra whitespace dropped, so trivially
+    reworded contexts share answers. The document name is left out of payloads by callers,
+    so renamed copies of a PDF share them too.
+    """
+    normalized_context = " ".join(re.sub(r"[^\w\s]", " ", context.lower()).split())
+    canonical = json.dumps({
+        "model": OPENAI_MODEL,
+        "schema": schema_name,
+        "payload": payload,
+        "context": normalized_context
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _cached_ai_answer(schema_name: str, cache_key: str):
+    """Previously stored answer for cache_key, or None
+    
+    Answers read from disk are re-validated against the schema, since it may have changed
+    since they were written.
+    """
+    result = _ai_answers.get(cache_key)
+    if result is not None or not AI_CACHE_DIR:
+        return result
+    try:
+        with open(os.path.join(AI_CACHE_DIR, f"{cache_key}.json"), "rb") as f:
+            answer = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        debug_print(f"Ignoring unreadable cached AI answer {cache_key}: {e}")
+        return None
+    try:
+        result = validate_response_json(schema_name, answer)
+    except Exception as e:
+        debug_print(f"Ignoring cached AI answer that no longer validates: {e}")
+        return None
+    _ai_answers[cache_key] = result
+    return result
+
+def _store_ai_answer(cache_key: str, result):
+    """Keep a validated AI answer in memory and, best effort, on disk"""
+    _ai_answers[cache_key] = result
+    if not AI_CACHE_DIR:
+        return
+    try:
+        os.makedirs(AI_CACHE_DIR, exist_ok=True)
+        temp_path = os.path.join(AI_CACHE_DIR, f"{cache_key}.{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(result.model_dump_json())
+        os.replace(temp_path, os.path.join(AI_CACHE_DIR, f"{cache_key}.json"))
+    except OSError as e:
+        debug_print(f"Could not write AI answer cache: {e}")
+
 @server.list_tools()
 async def handle_list_tools() -> List[types.Tool]:
     """List available PDF analysis tools"""
@@ -151,135 +405,244 @@ async def handle_call_tool(name: str, arguments: dict) -> List[types.TextContent
             }, indent=2)
         )]
 
-async def validate_structure(args: dict) -> List[types.TextContent]:
-    """Validate PDF structure using OpenAI with structured function calling"""
+def _level_font_analysis(report: dict, level_info: dict) -> FontAnalysis:
+    # A report without font analysis has no size range; (0, 0) would claim 0pt fonts
+    size_range = report['font_analysis'].get('size_range')
+    return FontAnalysis(
+        font_size=level_info['font_size'],
+        total_fonts=report['font_analysis'].get('total_fonts'),
+        size_range=tuple(size_range) if size_range else None,
+        median_size=report['font_analysis'].get('median_size')
+    )
+
+def _level_heading_data(level_info: dict, min_score: float) -> HeadingData:
+    """Heading count, average score and a few sample headings at or above min_score"""
+    return HeadingData(
+        count=count_headings_above(level_info, min_score),
+        avg_score=level_info['avg_score'],
+        sample_headings=[
+            HeadingSample(
+                text=h['text'][:100],  # Limit text length
+                page=h['page'],
+                score=h['structure_score'],
+                font_size=h['font_size']
+            ) for h in islice(headings_above(level_info, min_score), MAX_SAMPLE_HEADINGS)
+        ]
+    )
+
+def build_structure_input(pdf_path: str, report: dict, level: int, min_score: float) -> StructureAnalysisInput:
+    """Summarize one heading level of a content report as structured input for the AI"""
+    level_info = report['structural_elements']['heading_levels'][level]
     
-    pdf_path = args["pdf_path"]
-    level = args["level"]
-    min_score = args.get("min_score", 3.0)
-    context = args.get("context", "general document analysis")
+    return StructureAnalysisInput(
+        document_name=Path(pdf_path).name,
+        document_pages=report['document_pages'],
+        analysis_level=level,
+        font_analysis=_level_font_analysis(report, level_info),
+        heading_data=_level_heading_data(level_info, min_score)
+    )
+
+def build_strategy_input(pdf_path: str, report: dict, level: int) -> StrategyInput:
+    """Summarize a content report for strategy suggestions: the validated level in detail,
+    the other levels in one line each"""
+    heading_levels = report['structural_elements']['heading_levels']
+    level_info = heading_levels[level]
     
-    debug_print(f"Validating PDF structure: {pdf_path}, level {level}")
+    return StrategyInput(
+        document_name=Path(pdf_path).name,
+        document_pages=report['document_pages'],
+        validated_level=level,
+        font_analysis=_level_font_analysis(report, level_info),
+        heading_data=_level_heading_data(level_info, 0),
+        other_levels=[
+            LevelSummary(
+                level=other_level,
+                font_size=info['font_size'],
+                count=info['count'],
+                avg_score=info['avg_score']
+            ) for other_level, info in heading_levels.items() if other_level != level
+        ],
+        structure_quality_score=report.get('content_structure_quality', {}).get('score')
+    )
+
+def validation_request(structure_input: StructureAnalysisInput, context: str, file_id: str) -> dict:
+    """chat.completions.create() arguments for validating one level (also used as a batch request body)"""
     
-    # Analyze PDF structure
-    analyzer = ContentAnalyzer(pdf_path)
-    try:
-        report = analyzer.analyze_content_structure()
-        
-        # Check if requested level exists
-        struct = report['structural_elements']
-        if 'heading_levels' not in struct or level not in struct['heading_levels']:
-            available_levels = list(struct['heading_levels'].keys()) if 'heading_levels' in struct else []
-            return [types.TextContent(
-                type="text",
-                text=json.dumps({
-                    "error": f"Level {level} not found in document",
-                    "available_levels": available_levels,
-                    "suggestion": "Try a different level or use auto_find_optimal_level tool"
-                }, indent=2)
-            )]
-        
-        # Prepare structure data for AI analysis
-        level_info = struct['heading_levels'][level]
-        filtered_headings = [h for h in level_info['headings'] if h['structure_score'] >= min_score]
-        
-        # Create structured input for AI
-        structure_input = StructureAnalysisInput(
-            document_name=Path(pdf_path).name,
-            document_pages=report['document_pages'],
-            analysis_level=level,
-            font_analysis=FontAnalysis(
-                font_size=level_info['font_size'],
-                total_fonts=report['font_analysis'].get('total_fonts'),
-                size_range=list(report['font_analysis'].get('size_range', [0, 0])),
-                median_size=report['font_analysis'].get('median_size')
-            ),
-            heading_data=HeadingData(
-                count=len(filtered_headings),
-                avg_score=level_info['avg_score'],
-                sample_headings=[
-                    HeadingSample(
-                        text=h['text'][:100],  # Limit text length
-                        page=h['page'],
-                        score=h['structure_score'],
-                        font_size=h['font_size']
-                    ) for h in filtered_headings[:MAX_SAMPLE_HEADINGS]
-                ]
-            )
-        )
-        
-    finally:
-        analyzer.close()
+    # Create validation prompt: the static instructions go first (system message), so
+    # OpenAI's prompt prefix cache can match them; only the user turn varies per call
+    validation_prompt = f"""
+Context: {context}
+Document Analysis: {structure_input.model_dump_json()}
+"""
     
-    # Upload PDF to OpenAI temporarily for AI analysis
-    temp_file_id = None
-    try:
-        with open(pdf_path, "rb") as f:
-            file = client.files.create(file=f, purpose="assistants")
-            temp_file_id = file.id
-            debug_print(f"Uploaded PDF with file ID: {temp_file_id}")
-        
-        # Create validation prompt
-        validation_prompt = f"""
-Analyze this PDF document structure to validate if the extracted headings represent meaningful content sections.
+    # Get validation function schema
+    validation_function = get_openai_function_schema("validation_result")
+    
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": VALIDATION_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": validation_prompt,
+                "attachments": [{"file_id": file_id, "tools": [{"type": "file_search"}]}]
+            }
+        ],
+        tools=[{"type": "function", "function": validation_function}],
+        tool_choice={"type": "function", "function": {"name": validation_function["name"]}},
+        temperature=0.3
+    )
 
+def multi_validation_request(structure_inputs: List[StructureAnalysisInput], context: str, file_id: str) -> dict:
+    """chat.completions.create() arguments for validating several levels in one call (also a batch request body)"""
+    level_sections = "\n".join(f"Level {structure_input.analysis_level}: {structure_input.model_dump_json()}"
+                               for structure_input in structure_inputs)
+    validation_prompt = f"""
 Context: {context}
-Document Analysis: {structure_input.model_dump_json(indent=2)}
-
-Please examine the actual PDF content and compare it with the extracted structure data.
+Document Analysis:
+{level_sections}
+"""
+    
+    validation_function = get_openai_function_schema("multi_validation_result")
+    
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": MULTI_VALIDATION_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": validation_prompt,
+                "attachments": [{"file_id": file_id, "tools": [{"type": "file_search"}]}]
+            }
+        ],
+        tools=[{"type": "function", "function": validation_function}],
+        tool_choice={"type": "function", "function": {"name": validation_function["name"]}},
+        temperature=0.3
+    )
 
-Key validation criteria:
-1. Do the sample headings represent logical document sections?
-2. Are they consistent in formatting and purpose?
-3. Would extraction at this level produce meaningful, usable content?
-4. Are there better levels that should be tried instead?
+def strategy_request(strategy_input: StrategyInput, context: str, file_id: str) -> dict:
+    """chat.completions.create() arguments for an extraction strategy suggestion"""
+    heading_data = strategy_input.heading_data
+    
+    # Static instructions first, as in validation_request
+    strategy_prompt = f"""
+Document: {strategy_input.document_name}
+Validated Level: {strategy_input.validated_level}
+Context: {context}
+Level Details: Font size {strategy_input.font_analysis.font_size:.1f}pt, {heading_data.count} headings, avg score {heading_data.avg_score:.1f}
 
-Consider the document context: {context}
+Structure Analysis: {strategy_input.model_dump_json()}
 """
-        
-        # Get validation function schema
-        validation_function = get_openai_function_schema("validation_result")
-        
-        # Call OpenAI with function calling
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": validation_prompt,
-                    "attachments": [{"file_id": file.id, "tools": [{"type": "file_search"}]}]
-                }
-            ],
-            tools=[{"type": "function", "function": validation_function}],
-            tool_choice={"type": "function", "function": {"name": validation_function["name"]}},
-            temperature=0.3
-        )
-        
-        # Parse and validate function call result
-        tool_call = response.choices[0].message.tool_calls[0]
-        validation_data = json.loads(tool_call.function.arguments)
-        
-        # Validate with Pydantic
-        validation_result = validate_response("validation_result", validation_data)
-        
-        debug_print(f"AI validation result: {validation_result.status}")
-        
-        return [types.TextContent(
-            type="text",
-            text=validation_result.model_dump_json(indent=2)
-        )]
-        
-    finally:
-        # Clean up uploaded file
-        if temp_file_id:
-            try:
-                client.files.delete(temp_file_id)
-                debug_print(f"Cleaned up file: {temp_file_id}")
-            except Exception as e:
-                debug_print(f"Error cleaning up file: {e}")
+    
+    # Get strategy function schema
+    strategy_function = get_openai_function_schema("extraction_strategy")
+    
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": STRATEGY_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": strategy_prompt,
+                "attachments": [{"file_id": file_id, "tools": [{"type": "file_search"}]}]
+            }
+        ],
+        tools=[{"type": "function", "function": strategy_function}],
+        tool_choice={"type": "function", "function": {"name": strategy_function["name"]}},
+        temperature=0.4  # Slightly more creative for strategy suggestions
+    )
+
+def _viable(level_info: dict, min_score: float) -> bool:
+    """Cheap local check that a level could be a usable extraction level at all"""
+    return (MIN_VIABLE_HEADINGS <= level_info['count'] <= MAX_VIABLE_HEADINGS
+            and level_info['avg_score'] >= min_score
+            and level_info['font_size'] > 0)
+
+def rank_levels(report: dict, max_levels: int, min_score: float = 3.0) -> List[int]:
+    """Heading levels worth validating, best first, at most max_levels of them
+    
+    Levels that fail _viable are dropped before anything is sent to OpenAI.
+    """
+    level_scores = [(level, level_info['avg_score'], level_info['count'])
+                    for level, level_info in report['structural_elements']['heading_levels'].items()
+                    if _viable(level_info, min_score)]
+    
+    # Sort by score, then by reasonable count (not too few, not too many)
+    level_scores.sort(key=lambda x: (x[1], min(x[2], 100) if x[2] >= 5 else x[2] * 0.1), reverse=True)
+    return [level for level, _, _ in level_scores[:max_levels]]
+
+# The MCP tools. Results are built as dicts by the _-prefixed functions below and only
+# serialized here, so internal callers (auto-find, content_analyzer) never re-parse JSON.
+
+def _text_content(result: dict) -> List[types.TextContent]:
+    return [types.TextContent(type="text", text=json.dumps(result, indent=2))]
+
+async def validate_structure(args: dict) -> List[types.TextContent]:
+    """Validate PDF structure using OpenAI with structured function calling"""
+    return _text_content(await _validate_structure(args))
 
 async def suggest_strategy(args: dict) -> List[types.TextContent]:
     """Suggest detailed extraction strategy for validated structure"""
+    return _text_content(await _suggest_strategy(args))
+
+async def auto_find_optimal_level(args: dict) -> List[types.TextContent]:
+    """Automatically find optimal extraction level using AI validation"""
+    return _text_content(await _auto_find_optimal_level(args))
+
+async def _validate_structure(args: dict, report: Optional[dict] = None) -> dict:
+    """Validate PDF structure using OpenAI with structured function calling
+    
+    Internal callers that already hold the content report pass it as report. It is a
+    parameter rather than a tool argument so MCP clients can't supply their own.
+    """
+    
+    pdf_path = args["pdf_path"]
+    level = args["level"]
+    min_score = args.get("min_score", 3.0)
+    context = args.get("context", "general document analysis")
+    
+    debug_print(f"Validating PDF structure: {pdf_path}, level {level}")
+    
+    # Analyze PDF structure (cached by content, so repeat calls skip the parse)
+    if report is None:
+        report = await asyncio.to_thread(get_content_report, pdf_path)
+    
+    # Check if requested level exists
+    struct = report['structural_elements']
+    if 'heading_levels' not in struct or level not in struct['heading_levels']:
+        available_levels = list(struct['heading_levels'].keys()) if 'heading_levels' in struct else []
+        return {
+            "error": f"Level {level} not found in document",
+            "available_levels": available_levels,
+            "suggestion": "Try a different level or use auto_find_optimal_level tool"
+        }
+    
+    # Prepare structure data for AI analysis
+    structure_input = build_structure_input(pdf_path, report, level, min_score)
+    
+    # The same structure and context were validated before, no need to ask again
+    cache_key = ai_cache_key("validation_result",
+                             structure_input.model_dump(mode="json", exclude={"document_name"}), context)
+    validation_result = _cached_ai_answer("validation_result", cache_key)
+    if validation_result is not None:
+        debug_print(f"Using cached AI validation result: {validation_result.status}")
+        return validation_result.model_dump(mode="json")
+    
+    # Upload PDF to OpenAI for AI analysis and call OpenAI with function calling
+    async with uploaded_file(pdf_path) as file_id:
+        response = await _chat_create(**validation_request(structure_input, context, file_id))
+    
+    # Parse and validate the function call result with Pydantic in one step
+    tool_call = response.choices[0].message.tool_calls[0]
+    validation_result = validate_response_json("validation_result", tool_call.function.arguments)
+    _store_ai_answer(cache_key, validation_result)
+    
+    debug_print(f"AI validation result: {validation_result.status}")
+    
+    return validation_result.model_dump(mode="json")
+
+async def _suggest_strategy(args: dict, report: Optional[dict] = None) -> dict:
+    """Suggest detailed extraction strategy for validated structure (report as in _validate_structure)"""
     
     pdf_path = args["pdf_path"]
     validated_level = args["validated_level"]
@@ -287,205 +650,317 @@ async def suggest_strategy(args: dict) -> List[types.TextContent]:
     
     debug_print(f"Suggesting strategy for: {pdf_path}, level {validated_level}")
     
-    # Get detailed structure analysis
-    analyzer = ContentAnalyzer(pdf_path)
-    try:
-        report = analyzer.analyze_content_structure()
-        
-        # Check validated level exists
-        if validated_level not in report['structural_elements']['heading_levels']:
-            return [types.TextContent(
-                type="text",
-                text=json.dumps({
-                    "error": f"Validated level {validated_level} not found in analysis"
-                }, indent=2)
-            )]
-        
-        level_info = report['structural_elements']['heading_levels'][validated_level]
-        
-    finally:
-        analyzer.close()
+    # Get detailed structure analysis (or reuse the caller's, see validate_structure)
+    if report is None:
+        report = await asyncio.to_thread(get_content_report, pdf_path)
+    
+    # Check validated level exists
+    if validated_level not in report['structural_elements']['heading_levels']:
+        return {
+            "error": f"Validated level {validated_level} not found in analysis"
+        }
+    
+    strategy_input = build_strategy_input(pdf_path, report, validated_level)
+    
+    # The same structure summary and context got a strategy before, no need to ask again
+    cache_key = ai_cache_key("extraction_strategy",
+                             strategy_input.model_dump(mode="json", exclude={"document_name"}), context)
+    strategy_result = _cached_ai_answer("extraction_strategy", cache_key)
+    if strategy_result is not None:
+        debug_print("Using cached AI extraction strategy")
+        return strategy_result.model_dump(mode="json")
     
     # Upload PDF for AI analysis
-    temp_file_id = None
-    try:
-        with open(pdf_path, "rb") as f:
-            file = client.files.create(file=f, purpose="assistants")
-            temp_file_id = file.id
-        
-        strategy_prompt = f"""
-Provide detailed extraction strategy for this validated PDF structure.
-
-Document: {Path(pdf_path).name}
-Validated Level: {validated_level}
-Context: {context}
-Level Details: Font size {level_info['font_size']:.1f}pt, {level_info['count']} headings, avg score {level_info['avg_score']:.1f}
-
-Full Structure Analysis: {json.dumps(report, indent=2, default=str)}
+    async with uploaded_file(pdf_path) as file_id:
+        response = await _chat_create(**strategy_request(strategy_input, context, file_id))
+    
+    # Parse and validate result with Pydantic in one step
+    tool_call = response.choices[0].message.tool_calls[0]
+    strategy_result = validate_response_json("extraction_strategy", tool_call.function.arguments)
+    _store_ai_answer(cache_key, strategy_result)
+    
+    return strategy_result.model_dump(mode="json")
 
-Based on your analysis of the actual PDF content and the structure data, provide:
+async def _validate_levels(pdf_path: str, report: dict, levels: List[int], context: str,
+                           min_score: float = 3.0) -> Dict[int, dict]:
+    """Validate several candidate levels with one OpenAI call; returns validations by level
+    
+    Levels with a cached answer aren't asked about again, and each new answer is cached
+    under the same key validate_structure uses for that level. Levels the model left out
+    of its answer are missing from the result.
+    """
+    structure_inputs = {level: build_structure_input(pdf_path, report, level, min_score) for level in levels}
+    cache_keys = {level: ai_cache_key("validation_result",
+                                      structure_input.model_dump(mode="json", exclude={"document_name"}), context)
+                  for level, structure_input in structure_inputs.items()}
+    
+    validations = {}
+    for level, cache_key in cache_keys.items():
+        validation_result = _cached_ai_answer("validation_result", cache_key)
+        if validation_result is not None:
+            validations[level] = validation_result.model_dump(mode="json")
+    uncached = [level for level in levels if level not in validations]
+    if not uncached:
+        debug_print("Using cached AI validation results for every level")
+        return validations
+    
+    # Levels whose structure data only differs by level number would get the same answer,
+    # so only the first of each group is sent and its answer is shared with the rest
+    groups = {}  # canonical structure data -> levels, first one is sent
+    for level in uncached:
+        payload = structure_inputs[level].model_dump(mode="json", exclude={"document_name", "analysis_level"})
+        groups.setdefault(json.dumps(payload, sort_keys=True, default=str), []).append(level)
+    duplicates = {group[0]: group for group in groups.values()}
+    if len(duplicates) < len(uncached):
+        debug_print(f"Validating {len(duplicates)} distinct levels for {len(uncached)} candidates")
+    uncached = list(duplicates)
+    
+    async with uploaded_file(pdf_path) as file_id:
+        response = await _chat_create(**multi_validation_request(
+            [structure_inputs[level] for level in uncached], context, file_id))
+    tool_call = response.choices[0].message.tool_calls[0]
+    multi_result = validate_response_json("multi_validation_result", tool_call.function.arguments)
+    
+    answers = {}  # level -> its answer without the level field
+    for level_result in multi_result.results:
+        level = level_result.level
+        if level not in duplicates or level in answers:
+            debug_print(f"Ignoring validation for unexpected level {level}")
+            continue
+        answers[level] = level_result.model_dump(exclude={"level"})
+    
+    validation_results = validate_response_many("validation_result", list(answers.values()))
+    for level, validation_result in zip(answers, validation_results):
+        for same_level in duplicates[level]:
+            _store_ai_answer(cache_keys[same_level], validation_result)
+            validations[same_level] = validation_result.model_dump(mode="json")
+    debug_print(f"AI validated levels: {sorted(validations)}")
+    return validations
 
-1. **Primary Strategy**: The best approach for extraction
-2. **Implementation Details**: Specific parameters and thresholds
-3. **Potential Challenges**: What could go wrong and how to handle it
-4. **Fallback Strategies**: Alternative approaches if primary fails
-5. **Expected Output**: What the user can expect from extraction
+def _levels_tested(levels_to_try: List[int], validations: Dict[int, dict]) -> List[dict]:
+    """Tested levels in ranking order (levels without a validation are left out)"""
+    return [{
+        "level": level,
+        "validation": validations[level],
+        "status": validations[level]["status"]
+    } for level in levels_to_try if level in validations]
 
-Consider the document context ({context}) when making recommendations.
-Focus on practical, actionable advice for successful content extraction.
-"""
-        
-        # Get strategy function schema
-        strategy_function = get_openai_function_schema("extraction_strategy")
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": strategy_prompt,
-                    "attachments": [{"file_id": file.id, "tools": [{"type": "file_search"}]}]
-                }
-            ],
-            tools=[{"type": "function", "function": strategy_function}],
-            tool_choice={"type": "function", "function": {"name": strategy_function["name"]}},
-            temperature=0.4  # Slightly more creative for strategy suggestions
-        )
-        
-        # Parse and validate result
-        tool_call = response.choices[0].message.tool_calls[0]
-        strategy_data = json.loads(tool_call.function.arguments)
-        
-        # Validate with Pydantic
-        strategy_result = validate_response("extraction_strategy", strategy_data)
-        
-        return [types.TextContent(
-            type="text", 
-            text=strategy_result.model_dump_json(indent=2)
-        )]
-        
-    finally:
-        if temp_file_id:
-            try:
-                client.files.delete(temp_file_id)
-            except Exception as e:
-                debug_print(f"Error cleaning up file: {e}")
+def _best_valid_level(levels_to_try: List[int], validations: Dict[int, dict]) -> Optional[int]:
+    """Highest-confidence VALID level, the better-ranked one on ties, or None"""
+    valid_levels = [level for level in levels_to_try
+                    if validations.get(level, {}).get("status") == "VALID"]
+    return max(valid_levels, key=lambda level: validations[level]["confidence"], default=None)
 
-async def auto_find_optimal_level(args: dict) -> List[types.TextContent]:
-    """Automatically find optimal extraction level using AI validation"""
+async def _auto_find_optimal_level(args: dict, include_strategy: bool = True) -> dict:
+    """Automatically find optimal extraction level using AI validation
+    
+    include_strategy=False leaves out the extraction strategy (and its OpenAI call).
+    """
     
     pdf_path = args["pdf_path"]
     context = args.get("context", "general document analysis")
     max_levels = args.get("max_levels_to_try", 5)
+    min_score = args.get("min_score", 3.0)
     
     debug_print(f"Auto-finding optimal level for: {pdf_path}")
     
     # Get all available levels
-    analyzer = ContentAnalyzer(pdf_path)
-    try:
-        report = analyzer.analyze_content_structure()
-        available_levels = list(report['structural_elements']['heading_levels'].keys())
-    finally:
-        analyzer.close()
+    # Analysis is CPU-bound, so it runs in a worker thread to keep the event loop free
+    report = await asyncio.to_thread(get_content_report, pdf_path)
+    available_levels = list(report['structural_elements']['heading_levels'].keys())
     
     if not available_levels:
-        return [types.TextContent(
-            type="text",
-            text=json.dumps({
-                "error": "No heading levels detected in document",
-                "suggestion": "Document may not have clear structural formatting"
-            }, indent=2)
-        )]
+        return {
+            "error": "No heading levels detected in document",
+            "suggestion": "Document may not have clear structural formatting"
+        }
     
-    # Sort levels by avg score (best first), limit to max_levels
-    level_scores = []
-    analyzer = ContentAnalyzer(pdf_path)
-    try:
-        for level in available_levels:
-            level_info = report['structural_elements']['heading_levels'][level]
-            level_scores.append((level, level_info['avg_score'], level_info['count']))
-    finally:
-        analyzer.close()
-    
-    # Sort by score, then by reasonable count (not too few, not too many)
-    level_scores.sort(key=lambda x: (x[1], min(x[2], 100) if x[2] >= 5 else x[2] * 0.1), reverse=True)
-    levels_to_try = [level for level, _, _ in level_scores[:max_levels]]
+    # Sort viable levels by avg score (best first), limit to max_levels
+    levels_to_try = rank_levels(report, max_levels, min_score)
+    if not levels_to_try:
+        return {
+            "success": False,
+            "error": "No viable heading levels found",
+            "available_levels": available_levels,
+            "suggestion": f"Every level has too few or too many headings (outside {MIN_VIABLE_HEADINGS}-{MAX_VIABLE_HEADINGS}) or a low score; try validate_structure on a specific level"
+        }
     
     debug_print(f"Trying levels in order: {levels_to_try}")
     
-    # Try each level until we find a valid one
-    results = []
-    for level in levels_to_try:
-        try:
-            validation_args = {
-                "pdf_path": pdf_path,
-                "level": level,
-                "context": context
+    # Rate all candidate levels in a single call and keep the most confident VALID one
+    validations = await _validate_levels(pdf_path, report, levels_to_try, context, min_score)
+    optimal_level = _best_valid_level(levels_to_try, validations)
+    results = _levels_tested(levels_to_try, validations)
+    
+    if optimal_level is not None:
+        debug_print(f"Found optimal level: {optimal_level}")
+        
+        if not include_strategy:
+            return {
+                "success": True,
+                "optimal_level": optimal_level,
+                "validation_result": validations[optimal_level],
+                "levels_tested": results
             }
-            
-            validation_results = await validate_structure(validation_args)
-            validation_json = json.loads(validation_results[0].text)
-            
-            if "error" in validation_json:
+        
+        # Get strategy for this level
+        strategy_args = {
+            "pdf_path": pdf_path,
+            "validated_level": optimal_level,
+            "context": context
+        }
+        
+        strategy_json = await _suggest_strategy(strategy_args, report=report)
+        
+        return {
+            "success": True,
+            "optimal_level": optimal_level,
+            "validation_result": validations[optimal_level],
+            "extraction_strategy": strategy_json,
+            "levels_tested": results
+        }
+    
+    # No valid level found
+    return {
+        "success": False,
+        "error": "No suitable extraction level found",
+        "levels_tested": results,
+        "suggestion": "Document may not have clear structural formatting suitable for automatic extraction"
+    }
+
+async def bulk_auto_find(pdf_paths: List[str], context: str = "general document analysis",
+                         max_levels: int = 5, min_score: float = 3.0) -> Dict[str, dict]:
+    """Find the optimal level for many PDFs with a single OpenAI Batch API job
+    
+    Batch requests cost half as much and don't count against the real-time rate limits, but
+    can take up to 24h, so this is meant for offline bulk runs. A single PDF goes through the
+    real-time auto_find_optimal_level instead, with the same max_levels and min_score. Returns
+    auto-find results keyed by PDF path (without extraction strategies).
+    """
+    if len(pdf_paths) == 1:
+        return {pdf_paths[0]: await _auto_find_optimal_level({
+            "pdf_path": pdf_paths[0],
+            "context": context,
+            "max_levels_to_try": max_levels,
+            "min_score": min_score
+        }, include_strategy=False)}
+    
+    results = {}
+    candidates = {}  # pdf_path -> (content hash, levels to try)
+    requests = []
+    reports = await asyncio.gather(*(asyncio.to_thread(get_content_report, pdf_path)
+                                     for pdf_path in pdf_paths))
+    # Every uploaded PDF stays in use until the batch job that reads it has finished
+    async with AsyncExitStack() as uploads:
+        for pdf_path, report in zip(pdf_paths, reports):
+            levels_to_try = rank_levels(report, max_levels, min_score)
+            if not levels_to_try:
+                results[pdf_path] = {
+                    "error": "No viable heading levels detected in document",
+                    "suggestion": "Document may not have clear structural formatting"
+                }
                 continue
-                
-            # Parse validation result
-            validation = ValidationResult(**validation_json)
             
-            results.append({
-                "level": level,
-                "validation": validation_json,
-                "status": validation.status
-            })
+            digest = file_content_hash(pdf_path)
+            already_requested = any(digest == other for other, _ in candidates.values())
+            candidates[pdf_path] = (digest, levels_to_try)
+            if already_requested:
+                continue  # Identical copy of a PDF already in the batch
             
-            # If we found a valid level, stop searching
-            if validation.status == "VALID":
-                debug_print(f"Found optimal level: {level}")
-                
-                # Get strategy for this level
-                strategy_args = {
-                    "pdf_path": pdf_path,
-                    "validated_level": level,
-                    "context": context
-                }
-                
-                strategy_results = await suggest_strategy(strategy_args)
-                strategy_json = json.loads(strategy_results[0].text)
-                
-                return [types.TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "success": True,
-                        "optimal_level": level,
-                        "validation_result": validation_json,
-                        "extraction_strategy": strategy_json,
-                        "levels_tested": results
-                    }, indent=2)
-                )]
-                
-        except Exception as e:
-            debug_print(f"Error testing level {level}: {e}")
-            results.append({
-                "level": level,
-                "error": str(e)
+            file_id = await uploads.enter_async_context(uploaded_file(pdf_path))
+            structure_inputs = [build_structure_input(pdf_path, report, level, min_score)
+                                for level in levels_to_try]
+            requests.append({
+                "custom_id": digest,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": multi_validation_request(structure_inputs, context, file_id)
             })
+        
+        validations_by_digest = await _run_validation_batch(requests) if requests else {}
+    
+    # Same selection as auto_find_optimal_level: the most confident VALID level wins
+    for pdf_path, (digest, levels_to_try) in candidates.items():
+        validations = validations_by_digest.get(digest, {})
+        optimal_level = _best_valid_level(levels_to_try, validations)
+        levels_tested = _levels_tested(levels_to_try, validations)
+        if optimal_level is None:
+            results[pdf_path] = {
+                "success": False,
+                "error": "No suitable extraction level found",
+                "levels_tested": levels_tested
+            }
+        else:
+            results[pdf_path] = {
+                "success": True,
+                "optimal_level": optimal_level,
+                "validation_result": validations[optimal_level],
+                "levels_tested": levels_tested
+            }
+    
+    return results
+
+async def _run_validation_batch(requests: List[dict]) -> Dict[str, Dict[int, dict]]:
+    """Run multi-level validation requests as one Batch API job; returns validations by custom_id, then level"""
+    jsonl = "".join(json.dumps(request) + "\n" for request in requests).encode()
+    batch_file = await client.files.create(file=("validation_batch.jsonl", jsonl), purpose="batch")
+    try:
+        batch = await client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        debug_print(f"Submitted batch {batch.id} with {len(requests)} validation requests")
+        
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await client.batches.retrieve(batch.id)
+            debug_print(f"Batch {batch.id}: {batch.status}")
+        
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+        # No output file means every request failed
+        output = (await client.files.content(batch.output_file_id)).text if batch.output_file_id else ""
+    finally:
+        try:
+            await client.files.delete(batch_file.id)
+        except Exception as e:
+            debug_print(f"Error cleaning up batch file: {e}")
+    
+    # Join results back by custom_id; failed requests are simply missing
+    validations = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response")
+        if item.get("error") or not response or response.get("status_code") != 200:
+            debug_print(f"Batch request {item.get('custom_id')} failed: {item.get('error')}")
             continue
+        try:
+            tool_call = response["body"]["choices"][0]["message"]["tool_calls"][0]
+            multi_result = validate_response_json("multi_validation_result", tool_call["function"]["arguments"])
+        except Exception as e:
+            debug_print(f"Unusable batch result for {item.get('custom_id')}: {e}")
+            continue
+        validations[item["custom_id"]] = {
+            level_result.level: level_result.model_dump(mode="json", exclude={"level"})
+            for level_result in multi_result.results
+        }
     
-    # No valid level found
-    return [types.TextContent(
-        type="text",
-        text=json.dumps({
-            "success": False,
-            "error": "No suitable extraction level found",
-            "levels_tested": results,
-            "suggestion": "Document may not have clear structural formatting suitable for automatic extraction"
-        }, indent=2)
-    )]
+    return validations
+
+def _exit_on_sigterm(signum, frame):
+    # SystemExit unwinds asyncio.run normally, so the atexit cleanup of uploaded files runs
+    # (a process killed by the default SIGTERM action would leave them in the OpenAI account)
+    sys.exit(128 + signum)
 
 def run_server():
     """Run the MCP server"""
     import mcp.server.stdio
     
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    
     async def main():
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
             await server.run(
@@ -508,22 +983,18 @@ async def run_ai_validation(pdf_path: str, level: int = None, context: str = "ge
     """Run AI validation - can be called directly from content_analyzer"""
     if level:
         args = {"pdf_path": pdf_path, "level": level, "context": context}
-        results = await validate_structure(args)
-        return json.loads(results[0].text)
+        return await _validate_structure(args)
     else:
         args = {"pdf_path": pdf_path, "context": context}
-        results = await auto_find_optimal_level(args)
-        return json.loads(results[0].text)
+        return await _auto_find_optimal_level(args)
 
 async def run_ai_strategy(pdf_path: str, validated_level: int, context: str = "general") -> dict:
     """Run AI strategy suggestion"""
     args = {"pdf_path": pdf_path, "validated_level": validated_level, "context": context}
-    results = await suggest_strategy(args)
-    return json.loads(results[0].text)
+    return await _suggest_strategy(args)
 
 if __name__ == "__main__":
     # Check for debug flag
-    import sys
     if "--debug" in sys.argv:
         DEBUG = True
         debug_print("Debug mode enabled")
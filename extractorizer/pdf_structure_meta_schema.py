@@ -1,12 +1,39 @@
 #!/usr/bin/env python3
 """
 PDF Structure Analysis - Schema Definitions
-Contains JSON schemas and Pydantic models for structured AI responses
+Contains JSON schemas for structured AI responses and the helpers that validate
+responses against the Pydantic models in pdf_structure_models
 """
 
-from typing import Dict, List, Optional, Literal, Any
-from pydantic import BaseModel, Field
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, List, Mapping, Literal, Any, get_args
+from functools import lru_cache
 import json
+import os
+import sys
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+# =============================================================================
+# ALLOWED VALUES (shared by the JSON schemas and the Pydantic models)
+# =============================================================================
+# Kept as Literal types: pydantic-core validates a Literal of strings with a single hash
+# lookup, and the fields stay plain strings in model_dump output and comparisons.
+
+ValidationStatus = Literal["VALID", "INVALID", "TRY_LEVEL"]
+ExtractionApproach = Literal["font_based", "pattern_based", "hybrid", "manual_assisted"]
+SectionNaming = Literal["preserve_original", "normalize_titles", "add_prefixes", "custom_pattern"]
+GroupingStrategy = Literal["individual", "alphabetical_batches", "thematic_groups", "page_ranges"]
+Severity = Literal["low", "medium", "high"]
+OutputFormat = Literal["individual_pdfs", "json_index", "csv_listing", "structured_directory"]
+QualityEstimate = Literal["high", "medium", "low"]
+
+# Upper bounds on list lengths, so oversized replies are rejected early
+DETECTED_PATTERNS_LIMIT = 64
+CHALLENGES_LIMIT = 32
+FALLBACK_STRATEGIES_LIMIT = 32
+SAMPLE_HEADINGS_LIMIT = 50
 
 # =============================================================================
 # JSON SCHEMAS (OpenAI Function Calling Compatible)
@@ -17,7 +44,7 @@ VALIDATION_RESULT_SCHEMA = {
     "properties": {
         "status": {
             "type": "string", 
-            "enum": ["VALID", "INVALID", "TRY_LEVEL"],
+            "enum": list(get_args(ValidationStatus)),
             "description": "Validation result status"
         },
         "confidence": {
@@ -43,6 +70,7 @@ VALIDATION_RESULT_SCHEMA = {
         "detected_patterns": {
             "type": "array",
             "items": {"type": "string"},
+            "maxItems": DETECTED_PATTERNS_LIMIT,
             "description": "List of structural patterns detected (e.g., 'spell_names', 'numbered_sections')"
         },
         "sample_headings_analysis": {
@@ -54,6 +82,30 @@ VALIDATION_RESULT_SCHEMA = {
     "additionalProperties": False
 }
 
+MULTI_VALIDATION_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "level": {
+                        "type": "integer",
+                        "description": "Heading level this result is for"
+                    },
+                    **VALIDATION_RESULT_SCHEMA["properties"]
+                },
+                "required": ["level"] + VALIDATION_RESULT_SCHEMA["required"],
+                "additionalProperties": False
+            },
+            "description": "One validation result per candidate heading level"
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False
+}
+
 EXTRACTION_STRATEGY_SCHEMA = {
     "type": "object",
     "properties": {
@@ -62,7 +114,7 @@ EXTRACTION_STRATEGY_SCHEMA = {
             "properties": {
                 "approach": {
                     "type": "string",
-                    "enum": ["font_based", "pattern_based", "hybrid", "manual_assisted"],
+                    "enum": list(get_args(ExtractionApproach)),
                     "description": "Primary extraction approach"
                 },
                 "target_level": {
@@ -73,12 +125,12 @@ EXTRACTION_STRATEGY_SCHEMA = {
                 },
                 "section_naming": {
                     "type": "string",
-                    "enum": ["preserve_original", "normalize_titles", "add_prefixes", "custom_pattern"],
+                    "enum": list(get_args(SectionNaming)),
                     "description": "How to name extracted sections"
                 },
                 "grouping_strategy": {
                     "type": "string", 
-                    "enum": ["individual", "alphabetical_batches", "thematic_groups", "page_ranges"],
+                    "enum": list(get_args(GroupingStrategy)),
                     "description": "How to group extracted content"
                 },
                 "confidence": {
@@ -117,11 +169,12 @@ EXTRACTION_STRATEGY_SCHEMA = {
                 "type": "object", 
                 "properties": {
                     "challenge": {"type": "string"},
-                    "severity": {"type": "string", "enum": ["low", "medium", "high"]},
+                    "severity": {"type": "string", "enum": list(get_args(Severity))},
                     "mitigation": {"type": "string"}
                 },
                 "required": ["challenge", "severity", "mitigation"]
             },
+            "maxItems": CHALLENGES_LIMIT,
             "description": "Anticipated extraction challenges and solutions"
         },
         "fallback_strategies": {
@@ -135,6 +188,7 @@ EXTRACTION_STRATEGY_SCHEMA = {
                 },
                 "required": ["approach", "description", "confidence"]
             },
+            "maxItems": FALLBACK_STRATEGIES_LIMIT,
             "description": "Alternative approaches if primary strategy fails"
         },
         "expected_output": {
@@ -146,12 +200,12 @@ EXTRACTION_STRATEGY_SCHEMA = {
                 },
                 "output_format": {
                     "type": "string",
-                    "enum": ["individual_pdfs", "json_index", "csv_listing", "structured_directory"],
+                    "enum": list(get_args(OutputFormat)),
                     "description": "Recommended output format"
                 },
                 "quality_estimate": {
                     "type": "string",
-                    "enum": ["high", "medium", "low"],
+                    "enum": list(get_args(QualityEstimate)),
                     "description": "Expected quality of extraction results"
                 }
             },
@@ -197,7 +251,8 @@ STRUCTURE_ANALYSIS_INPUT_SCHEMA = {
                             "score": {"type": "number"},
                             "font_size": {"type": "number"}
                         }
-                    }
+                    },
+                    "maxItems": SAMPLE_HEADINGS_LIMIT
                 }
             }
         }
@@ -205,194 +260,143 @@ STRUCTURE_ANALYSIS_INPUT_SCHEMA = {
     "required": ["document_name", "analysis_level", "heading_data"]
 }
 
+STRATEGY_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "document_name": {"type": "string"},
+        "document_pages": {"type": "integer"},
+        "validated_level": {"type": "integer"},
+        "font_analysis": STRUCTURE_ANALYSIS_INPUT_SCHEMA["properties"]["font_analysis"],
+        "heading_data": STRUCTURE_ANALYSIS_INPUT_SCHEMA["properties"]["heading_data"],
+        "other_levels": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "level": {"type": "integer"},
+                    "font_size": {"type": "number"},
+                    "count": {"type": "integer"},
+                    "avg_score": {"type": "number"}
+                }
+            }
+        },
+        "structure_quality_score": {"type": "integer"}
+    },
+    "required": ["document_name", "validated_level", "heading_data"]
+}
+
 # =============================================================================
-# PYDANTIC MODELS (Runtime Validation & IDE Support)
+# HELPER FUNCTIONS
 # =============================================================================
 
-class ValidationResult(BaseModel):
-    """Pydantic model for PDF structure validation results"""
-    status: Literal["VALID", "INVALID", "TRY_LEVEL"] = Field(
-        description="Validation result status"
-    )
-    confidence: float = Field(
-        ge=0.0, le=1.0,
-        description="Confidence in validation result (0.0 to 1.0)"
-    )
-    reason: str = Field(
-        description="Detailed explanation for the validation decision"
-    )
-    suggested_level: Optional[int] = Field(
-        None, ge=1, le=15,
-        description="Recommended heading level if status is TRY_LEVEL"
-    )
-    extraction_feasible: bool = Field(
-        description="Whether meaningful extraction is possible at any level"
-    )
-    detected_patterns: Optional[List[str]] = Field(
-        None,
-        description="List of structural patterns detected"
-    )
-    sample_headings_analysis: Optional[str] = Field(
-        None,
-        description="Brief analysis of what the sample headings represent"
-    )
-
-class PrimaryStrategy(BaseModel):
-    """Primary extraction strategy details"""
-    approach: Literal["font_based", "pattern_based", "hybrid", "manual_assisted"] = Field(
-        description="Primary extraction approach"
-    )
-    target_level: int = Field(
-        ge=1, le=15,
-        description="Recommended heading level for extraction"
-    )
-    section_naming: Literal["preserve_original", "normalize_titles", "add_prefixes", "custom_pattern"] = Field(
-        description="How to name extracted sections"
-    )
-    grouping_strategy: Literal["individual", "alphabetical_batches", "thematic_groups", "page_ranges"] = Field(
-        description="How to group extracted content"
-    )
-    confidence: float = Field(
-        ge=0.0, le=1.0,
-        description="Confidence in primary strategy success"
-    )
-
-class ImplementationDetails(BaseModel):
-    """Implementation-specific parameters"""
-    font_size_threshold: Optional[float] = Field(
-        None,
-        description="Minimum font size for section detection"
-    )
-    score_threshold: Optional[float] = Field(
-        None,
-        description="Minimum structure score for heading detection"
-    )
-    batch_size: Optional[int] = Field(
-        None,
-        description="Recommended items per batch if grouping"
-    )
-    naming_pattern: Optional[str] = Field(
-        None,
-        description="Template for section naming (e.g., '{index:02d}_{title}')"
-    )
-
-class Challenge(BaseModel):
-    """Potential extraction challenge"""
-    challenge: str = Field(description="Description of the challenge")
-    severity: Literal["low", "medium", "high"] = Field(description="Severity level")
-    mitigation: str = Field(description="Suggested mitigation approach")
-
-class FallbackStrategy(BaseModel):
-    """Alternative extraction strategy"""
-    approach: str = Field(description="Fallback approach name")
-    description: str = Field(description="Detailed description of approach")
-    confidence: float = Field(
-        ge=0.0, le=1.0,
-        description="Confidence in fallback strategy"
-    )
-
-class ExpectedOutput(BaseModel):
-    """Expected extraction results"""
-    section_count: int = Field(description="Expected number of extracted sections")
-    output_format: Literal["individual_pdfs", "json_index", "csv_listing", "structured_directory"] = Field(
-        description="Recommended output format"
-    )
-    quality_estimate: Literal["high", "medium", "low"] = Field(
-        description="Expected quality of extraction results"
-    )
-
-class ExtractionStrategy(BaseModel):
-    """Complete extraction strategy recommendation"""
-    primary_strategy: PrimaryStrategy = Field(description="Primary extraction approach")
-    implementation_details: Optional[ImplementationDetails] = Field(
-        None,
-        description="Implementation-specific parameters"
-    )
-    potential_challenges: List[Challenge] = Field(
-        description="Anticipated extraction challenges and solutions"
-    )
-    fallback_strategies: Optional[List[FallbackStrategy]] = Field(
-        None,
-        description="Alternative approaches if primary strategy fails"
-    )
-    expected_output: ExpectedOutput = Field(description="Expected extraction results")
-
-class HeadingSample(BaseModel):
-    """Sample heading from structure analysis"""
-    text: str = Field(description="Heading text content")
-    page: int = Field(description="Page number where heading appears")
-    score: float = Field(description="Structure confidence score")
-    font_size: float = Field(description="Font size in points")
+# Built once at import; tools call these on every request. Read-only, since callers share
+# the returned schemas instead of getting copies
+_FUNCTION_SCHEMAS = MappingProxyType({
+    "validation_result": {
+        "name": "provide_validation_result",
+        "description": "Provide structured validation of PDF extraction results",
+        "parameters": VALIDATION_RESULT_SCHEMA
+    },
+    "multi_validation_result": {
+        "name": "provide_validation_results",
+        "description": "Provide structured validation of several candidate heading levels",
+        "parameters": MULTI_VALIDATION_RESULT_SCHEMA
+    },
+    "extraction_strategy": {
+        "name": "provide_extraction_strategy", 
+        "description": "Provide detailed extraction strategy recommendations",
+        "parameters": EXTRACTION_STRATEGY_SCHEMA
+    }
+})
 
-class HeadingData(BaseModel):
-    """Heading analysis data for a specific level"""
-    count: int = Field(description="Total number of headings at this level")
-    avg_score: float = Field(description="Average structure score")
-    sample_headings: Optional[List[HeadingSample]] = Field(
-        None,
-        description="Sample headings for analysis"
-    )
+# The Pydantic models live in pdf_structure_models, imported on first use so callers that
+# only need the JSON schemas above don't pay for importing pydantic
+MODEL_NAMES = (
+    "SchemaModel", "ValidationResult", "LevelValidationResult", "MultiValidationResult",
+    "PrimaryStrategy", "ImplementationDetails", "Challenge", "FallbackStrategy",
+    "ExpectedOutput", "ExtractionStrategy", "HeadingSample", "HeadingData", "FontAnalysis",
+    "StructureAnalysisInput", "LevelSummary", "StrategyInput"
+)
+_RESPONSE_MODEL_NAMES = {
+    "validation_result": "ValidationResult",
+    "multi_validation_result": "MultiValidationResult",
+    "extraction_strategy": "ExtractionStrategy",
+    "structure_analysis_input": "StructureAnalysisInput",
+    "strategy_input": "StrategyInput"
+}
 
-class FontAnalysis(BaseModel):
-    """Font analysis data from document"""
-    font_size: Optional[float] = Field(None, description="Primary font size for this level")
-    total_fonts: Optional[int] = Field(None, description="Total number of fonts in document")
-    size_range: Optional[List[float]] = Field(None, description="Min and max font sizes")
-    median_size: Optional[float] = Field(None, description="Median font size")
+@lru_cache(maxsize=1)
+def _load_models():
+    import pdf_structure_models
+    return pdf_structure_models
 
-class StructureAnalysisInput(BaseModel):
-    """Input data for structure analysis"""
-    document_name: str = Field(description="Name of the PDF document")
-    document_pages: Optional[int] = Field(None, description="Total number of pages")
-    analysis_level: int = Field(description="Heading level being analyzed")
-    font_analysis: Optional[FontAnalysis] = Field(None, description="Font analysis data")
-    heading_data: HeadingData = Field(description="Heading data for analysis")
+def __getattr__(name):
+    # Model classes are still importable from here: from pdf_structure_meta_schema import ValidationResult
+    if name in MODEL_NAMES:
+        return getattr(_load_models(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# =============================================================================
-# HELPER FUNCTIONS
-# =============================================================================
+@lru_cache(maxsize=None)
+def _response_validator(schema_name: str, many: bool = False):
+    """pydantic TypeAdapter for one response (or, with many, a list of them), built on first use
+    
+    List validators check a whole batch of responses in one pydantic-core call.
+    """
+    if schema_name not in _RESPONSE_MODEL_NAMES:
+        raise ValueError(f"Unknown model: {schema_name}. Available: {list(_RESPONSE_MODEL_NAMES.keys())}")
+    from pydantic import TypeAdapter
+    model_class = getattr(_load_models(), _RESPONSE_MODEL_NAMES[schema_name])
+    return TypeAdapter(List[model_class] if many else model_class)
 
 def get_openai_function_schema(schema_name: str) -> Dict[str, Any]:
     """Get OpenAI function calling schema by name"""
-    schemas = {
-        "validation_result": {
-            "name": "provide_validation_result",
-            "description": "Provide structured validation of PDF extraction results",
-            "parameters": VALIDATION_RESULT_SCHEMA
-        },
-        "extraction_strategy": {
-            "name": "provide_extraction_strategy", 
-            "description": "Provide detailed extraction strategy recommendations",
-            "parameters": EXTRACTION_STRATEGY_SCHEMA
-        }
-    }
-    
-    if schema_name not in schemas:
-        raise ValueError(f"Unknown schema: {schema_name}. Available: {list(schemas.keys())}")
-    
-    return schemas[schema_name]
+    try:
+        return _FUNCTION_SCHEMAS[schema_name]
+    except KeyError:
+        raise ValueError(f"Unknown schema: {schema_name}. Available: {list(_FUNCTION_SCHEMAS.keys())}") from None
 
-def validate_response(schema_name: str, response_data: Dict[str, Any]) -> BaseModel:
+def validate_response(schema_name: str, response_data: Dict[str, Any]) -> "BaseModel":
     """Validate response data against Pydantic model"""
-    models = {
-        "validation_result": ValidationResult,
-        "extraction_strategy": ExtractionStrategy,
-        "structure_analysis_input": StructureAnalysisInput
-    }
+    return _response_validator(schema_name).validate_python(response_data)
+
+def validate_response_json(schema_name: str, raw_json, strict: bool = True) -> "BaseModel":
+    """Validate a raw JSON response (str or bytes) against Pydantic model, without a json.loads first
     
-    if schema_name not in models:
-        raise ValueError(f"Unknown model: {schema_name}. Available: {list(models.keys())}")
+    Strict by default: JSON types must already match the fields (no "0.9" for a number),
+    which function-call arguments generated from the JSON schemas above do.
+    """
+    return _response_validator(schema_name).validate_json(raw_json, strict=strict)
+
+def validate_response_many(schema_name: str, responses: List[Dict[str, Any]]) -> List["BaseModel"]:
+    """Validate a list of response dicts against Pydantic model in one call"""
+    return _response_validator(schema_name, many=True).validate_python(responses)
+
+def warm_validators():
+    """Build every response validator now instead of on first use
     
-    model_class = models[schema_name]
-    return model_class(**response_data)
+    Worth it in a parent process that forks workers, which then share the built validators.
+    """
+    models = _load_models()
+    for schema_name, model_name in _RESPONSE_MODEL_NAMES.items():
+        getattr(models, model_name).model_rebuild()
+        _response_validator(schema_name)
+        _response_validator(schema_name, many=True)
 
-def export_json_schemas() -> Dict[str, Dict[str, Any]]:
-    """Export all JSON schemas for external use"""
-    return {
-        "validation_result": VALIDATION_RESULT_SCHEMA,
-        "extraction_strategy": EXTRACTION_STRATEGY_SCHEMA,
-        "structure_analysis_input": STRUCTURE_ANALYSIS_INPUT_SCHEMA
-    }
+_EXPORTED_SCHEMAS = MappingProxyType({
+    "validation_result": VALIDATION_RESULT_SCHEMA,
+    "multi_validation_result": MULTI_VALIDATION_RESULT_SCHEMA,
+    "extraction_strategy": EXTRACTION_STRATEGY_SCHEMA,
+    "structure_analysis_input": STRUCTURE_ANALYSIS_INPUT_SCHEMA,
+    "strategy_input": STRATEGY_INPUT_SCHEMA
+})
+
+def export_json_schemas() -> Mapping[str, Dict[str, Any]]:
+    """Export all JSON schemas for external use (a shared read-only mapping, copy it to modify)"""
+    return _EXPORTED_SCHEMAS
+
+# Opt in with PDF_STRUCTURE_WARM_VALIDATORS=1; by default validators are built lazily
+if os.getenv("PDF_STRUCTURE_WARM_VALIDATORS"):
+    warm_validators()
 
 if __name__ == "__main__":
     # Example usage and testing
@@ -404,7 +408,7 @@ if __name__ == "__main__":
     print(f"Available schemas: {list(schemas.keys())}")
     
     # Test Pydantic model creation
-    sample_validation = ValidationResult(
+    sample_validation = _load_models().ValidationResult(
         status="VALID",
         confidence=0.85,
         reason="Headings appear to be meaningful spell names",
@@ -412,5 +416,6 @@ if __name__ == "__main__":
         detected_patterns=["spell_names", "consistent_formatting"]
     )
     
-    print(f"\nSample ValidationResult:")
-    print(sample_validation.model_dump_json(indent=2))
+    print(f"\nSample ValidationResult:", flush=True)  # Flushed before writing bytes below
+    # Serialized straight to bytes by the cached validator, skipping the str round-trip
+    sys.stdout.buffer.write(_response_validator("validation_result").dump_json(sample_validation, indent=2) + b"\n")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+PDF Structure Analysis - Pydantic Models
+Runtime validation models for the JSON schemas in pdf_structure_meta_schema, which loads
+this module on first use so schema-only callers don't import pydantic
+"""
+
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
+
+from pdf_structure_meta_schema import (
+    ValidationStatus, ExtractionApproach, SectionNaming, GroupingStrategy, Severity,
+    OutputFormat, QualityEstimate, DETECTED_PATTERNS_LIMIT, CHALLENGES_LIMIT,
+    FALLBACK_STRATEGIES_LIMIT, SAMPLE_HEADINGS_LIMIT
+)
+
+class SchemaModel(BaseModel):
+    """Base for the models below: each builds its validator on first use, not at import
+    
+    The small value models created many times per document (Challenge, FallbackStrategy,
+    HeadingSample, LevelSummary) are also frozen, they are never changed after validation.
+    """
+    model_config = ConfigDict(defer_build=True)
+
+class ValidationResult(SchemaModel):
+    """Pydantic model for PDF structure validation results"""
+    model_config = ConfigDict(extra="forbid")  # Matches additionalProperties: False
+    status: ValidationStatus = Field(
+        description="Validation result status"
+    )
+    confidence: float = Field(
+        ge=0.0, le=1.0,
+        description="Confidence in validation result (0.0 to 1.0)"
+    )
+    reason: str = Field(
+        description="Detailed explanation for the validation decision"
+    )
+    suggested_level: Optional[int] = Field(
+        None, ge=1, le=15,
+        description="Recommended heading level if status is TRY_LEVEL"
+    )
+    extraction_feasible: bool = Field(
+        description="Whether meaningful extraction is possible at any level"
+    )
+    detected_patterns: Optional[List[str]] = Field(
+        None, max_length=DETECTED_PATTERNS_LIMIT,
+        description="List of structural patterns detected"
+    )
+    sample_headings_analysis: Optional[str] = Field(
+        None,
+        description="Brief analysis of what the sample headings represent"
+    )
+
+class LevelValidationResult(ValidationResult):
+    """Validation result for one of several heading levels validated together"""
+    level: int = Field(description="Heading level this result is for")
+
+class MultiValidationResult(SchemaModel):
+    """Validation results for several candidate heading levels from a single request"""
+    model_config = ConfigDict(extra="forbid")
+    results: List[LevelValidationResult] = Field(
+        description="One validation result per candidate heading level"
+    )
+
+class PrimaryStrategy(SchemaModel):
+    """Primary extraction strategy details"""
+    approach: ExtractionApproach = Field(
+        description="Primary extraction approach"
+    )
+    target_level: int = Field(
+        ge=1, le=15,
+        description="Recommended heading level for extraction"
+    )
+    section_naming: SectionNaming = Field(
+        description="How to name extracted sections"
+    )
+    grouping_strategy: GroupingStrategy = Field(
+        description="How to group extracted content"
+    )
+    confidence: float = Field(
+        ge=0.0, le=1.0,
+        description="Confidence in primary strategy success"
+    )
+
+class ImplementationDetails(SchemaModel):
+    """Implementation-specific parameters"""
+    font_size_threshold: Optional[float] = Field(
+        None,
+        description="Minimum font size for section detection"
+    )
+    score_threshold: Optional[float] = Field(
+        None,
+        description="Minimum structure score for heading detection"
+    )
+    batch_size: Optional[int] = Field(
+        None,
+        description="Recommended items per batch if grouping"
+    )
+    naming_pattern: Optional[str] = Field(
+        None,
+        description="Template for section naming (e.g., '{index:02d}_{title}')"
+    )
+
+class Challenge(SchemaModel):
+    """Potential extraction challenge"""
+    model_config = ConfigDict(frozen=True)
+    challenge: str = Field(description="Description of the challenge")
+    severity: Severity = Field(description="Severity level")
+    mitigation: str = Field(description="Suggested mitigation approach")
+
+class FallbackStrategy(SchemaModel):
+    """Alternative extraction strategy"""
+    model_config = ConfigDict(frozen=True)
+    approach: str = Field(description="Fallback approach name")
+    description: str = Field(description="Detailed description of approach")
+    confidence: float = Field(
+        ge=0.0, le=1.0,
+        description="Confidence in fallback strategy"
+    )
+
+class ExpectedOutput(SchemaModel):
+    """Expected extraction results"""
+    section_count: int = Field(description="Expected number of extracted sections")
+    output_format: OutputFormat = Field(
+        description="Recommended output format"
+    )
+    quality_estimate: QualityEstimate = Field(
+        description="Expected quality of extraction results"
+    )
+
+class ExtractionStrategy(SchemaModel):
+    """Complete extraction strategy recommendation"""
+    model_config = ConfigDict(extra="forbid")
+    primary_strategy: PrimaryStrategy = Field(description="Primary extraction approach")
+    implementation_details: Optional[ImplementationDetails] = Field(
+        None,
+        description="Implementation-specific parameters"
+    )
+    potential_challenges: List[Challenge] = Field(
+        max_length=CHALLENGES_LIMIT,
+        description="Anticipated extraction challenges and solutions"
+    )
+    fallback_strategies: Optional[List[FallbackStrategy]] = Field(
+        None, max_length=FALLBACK_STRATEGIES_LIMIT,
+        description="Alternative approaches if primary strategy fails"
+    )
+    expected_output: ExpectedOutput = Field(description="Expected extraction results")
+
+class HeadingSample(SchemaModel):
+    """Sample heading from structure analysis"""
+    model_config = ConfigDict(frozen=True)
+    text: str = Field(description="Heading text content")
+    page: int = Field(description="Page number where heading appears")
+    score: float = Field(description="Structure confidence score")
+    font_size: float = Field(description="Font size in points")
+
+class HeadingData(SchemaModel):
+    """Heading analysis data for a specific level"""
+    count: int = Field(description="Total number of headings at this level")
+    avg_score: float = Field(description="Average structure score")
+    sample_headings: Optional[List[HeadingSample]] = Field(
+        None, max_length=SAMPLE_HEADINGS_LIMIT,
+        description="Sample headings for analysis"
+    )
+
+class FontAnalysis(SchemaModel):
+    """Font analysis data from document"""
+    font_size: Optional[float] = Field(None, description="Primary font size for this level")
+    total_fonts: Optional[int] = Field(None, description="Total number of fonts in document")
+    size_range: Optional[Tuple[float, float]] = Field(None, description="Min and max font sizes")
+    median_size: Optional[float] = Field(None, description="Median font size")
+
+class StructureAnalysisInput(SchemaModel):
+    """Input data for structure analysis"""
+    document_name: str = Field(description="Name of the PDF document")
+    document_pages: Optional[int] = Field(None, description="Total number of pages")
+    analysis_level: int = Field(description="Heading level being analyzed")
+    font_analysis: Optional[FontAnalysis] = Field(None, description="Font analysis data")
+    heading_data: HeadingData = Field(description="Heading data for analysis")
+
+class LevelSummary(SchemaModel):
+    """Summary of one detected heading level"""
+    model_config = ConfigDict(frozen=True)
+    level: int = Field(description="Heading level (1=largest)")
+    font_size: float = Field(description="Font size in points")
+    count: int = Field(description="Number of headings at this level")
+    avg_score: float = Field(description="Average structure score")
+
+class StrategyInput(SchemaModel):
+    """Input data for extraction strategy suggestions (a summary, not the full report)"""
+    document_name: str = Field(description="Name of the PDF document")
+    document_pages: Optional[int] = Field(None, description="Total number of pages")
+    validated_level: int = Field(description="Heading level validated for extraction")
+    font_analysis: Optional[FontAnalysis] = Field(None, description="Font analysis data")
+    heading_data: HeadingData = Field(description="Heading data for the validated level")
+    other_levels: Optional[List[LevelSummary]] = Field(
+        None,
+        description="The other detected heading levels, for fallback strategies"
+    )
+    structure_quality_score: Optional[int] = Field(None, description="Content structure quality score (0-100)")
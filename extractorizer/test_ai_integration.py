@@ -12,9 +12,10 @@ def demo_ai_integration():
     print("🤖 AI Integration Demo - PDF Structure Analysis")
     print("=" * 60)
     
-    # Demo validation result
+    # Demo validation result. The demo data are trusted constants, so the models are built
+    # with model_construct and skip validation; responses from OpenAI are always validated.
     print("\n1. 📋 AI Validation Result:")
-    validation = ValidationResult(
+    validation = ValidationResult.model_construct(
         status="VALID",
         confidence=0.92,
         reason="The extracted headings represent individual D&D spell names with consistent formatting and logical structure. Font size (12.0pt) and formatting patterns indicate these are primary content sections suitable for individual extraction.",
@@ -30,8 +31,8 @@ def demo_ai_integration():
     
     # Demo extraction strategy
     print("\n2. 🛠️ AI Extraction Strategy:")
-    strategy = ExtractionStrategy(
-        primary_strategy=PrimaryStrategy(
+    strategy = ExtractionStrategy.model_construct(
+        primary_strategy=PrimaryStrategy.model_construct(
             approach="font_based",
             target_level=4,
             section_naming="preserve_original",
@@ -39,18 +40,18 @@ def demo_ai_integration():
             confidence=0.88
         ),
         potential_challenges=[
-            Challenge(
+            Challenge.model_construct(
                 challenge="Some spell names may span multiple lines",
                 severity="medium",
                 mitigation="Use font size thresholds and line proximity analysis"
             ),
-            Challenge(
+            Challenge.model_construct(
                 challenge="Spell descriptions may contain bold subheadings",
                 severity="low", 
                 mitigation="Filter by minimum score threshold (>=10) to focus on main spell names"
             )
         ],
-        expected_output=ExpectedOutput(
+        expected_output=ExpectedOutput.model_construct(
             section_count=113,
             output_format="individual_pdfs",
             quality_estimate="high"
@@ -83,8 +84,8 @@ def demo_ai_integration():
     
     # Demo JSON output
     print("\n4. 📄 JSON Schema Validation:")
-    print("✅ ValidationResult schema validation passed")
-    print("✅ ExtractionStrategy schema validation passed")
+    print("✅ ValidationResult schema ready")
+    print("✅ ExtractionStrategy schema ready")
     print("✅ Pydantic models provide runtime validation")
     print("✅ OpenAI function calling schemas ready")
 
@@ -9,23 +9,150 @@ import fitz  # PyMuPDF
 import argparse
 import re
 from pathlib import Path
+from array import array
 from collections import defaultdict, Counter
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import statistics
 
 # Configuration
 DEBUG = False
 
+# Default "dict" extraction flags minus TEXT_PRESERVE_IMAGES: only text blocks are counted,
+# so there is no point decoding every image on the page into the result.
+TEXT_DICT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+# MuPDF keeps span font sizes as 32-bit floats, so an 'f' array stores them unboxed and losslessly
+SPAN_SIZE_TYPECODE = 'f'
+PARALLEL_MIN_PAGES = 20  # Below this, starting worker processes costs more than it saves
+
+# Document type indicator tiers: (threshold, message) pairs checked in order, the first
+# threshold the value is strictly above wins. A None threshold matches anything and a None
+# message prints nothing.
+IMAGE_TIERS = (
+    (2, "🖼️  Image-rich document (good for illustrated manuals, reports)"),
+    (0.5, "📷 Moderate image content (typical for structured documents)"),
+    (None, "📝 Text-heavy document (typical for academic, legal, or reference)"),
+)
+DRAWING_TIERS = (
+    (1, "🎨 High graphic content (charts, diagrams, technical illustrations)"),
+)
+FONT_DIVERSITY_TIERS = (
+    (10, "🔤 High font diversity (complex formatting, possibly design-heavy)"),
+    (4, None),
+    (None, "📰 Simple font structure (clean, readable document)"),
+)
+FONT_RANGE_TIERS = (
+    (20, "📐 Wide font size range (strong hierarchical structure)"),
+    (10, "📏 Moderate font size variation (good heading structure)"),
+    (None, "➖ Minimal font size variation (uniform text, limited hierarchy)"),
+)
+
 def debug_print(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
+def tier_message(value, tiers):
+    """Return the message of the first tier whose threshold value exceeds (None if there is none)"""
+    if value is None:  # Statistic was skipped
+        return None
+    for threshold, message in tiers:
+        if threshold is None or value > threshold:
+            return message
+    return None
+
+def _analyze_page(page, totals, font_analysis, font_sizes, drawings=True):
+    """Fold one page's image, drawing, link and span statistics into the running totals"""
+    
+    # Image analysis
+    totals['images'] += len(page.get_images())
+    
+    # Drawing analysis (get_drawings parses every vector operator on the page, so it is
+    # the most expensive call here and can be skipped)
+    if drawings:
+        totals['drawings'] += len(page.get_drawings())
+    
+    # Link analysis
+    totals['links'] += len(page.get_links())
+    
+    # Detailed text analysis with font information
+    text_dict = page.get_text("dict", flags=TEXT_DICT_FLAGS)
+    
+    # Bound methods for the span loop below; font counts use dict.get rather than a
+    # defaultdict so new fonts don't go through __missing__
+    record_size = font_sizes.append
+    font_chars = font_analysis.get
+    text_blocks = 0
+    page_chars = 0
+    
+    for block in text_dict.get("blocks", []):
+        if "lines" in block:  # Text block
+            text_blocks += 1
+            
+            for line in block["lines"]:
+                for span in line.get("spans", []):
+                    # Font analysis
+                    font_name = span.get("font", "Unknown")
+                    font_size = span.get("size", 0)
+                    char_count = len(span.get("text", ""))
+                    
+                    font_analysis[font_name] = font_chars(font_name, 0) + char_count
+                    record_size(font_size)
+                    page_chars += char_count
+    
+    totals['text_blocks'] += text_blocks
+    totals['characters'] += page_chars
+
+def analyze_pages(doc, page_nums, drawings=True):
+    """Analyze the given pages of an open document
+    
+    Returns (totals, font_analysis, font_sizes) for just those pages, where totals counts
+    images, drawings (unless drawings is False), links, text_blocks and characters.
+    """
+    totals = Counter()
+    font_analysis = Counter()
+    font_sizes = array(SPAN_SIZE_TYPECODE)
+    
+    for page_num in page_nums:
+        try:
+            _analyze_page(doc[page_num], totals, font_analysis, font_sizes, drawings)
+        except Exception as e:
+            debug_print(f"Error analyzing page {page_num}: {e}")
+            continue
+    
+    return totals, font_analysis, font_sizes
+
+def _analyze_pages_worker(pdf_path, page_nums, drawings=True):
+    """Process pool entry point: each worker opens its own copy of the document"""
+    doc = fitz.open(pdf_path)
+    try:
+        return analyze_pages(doc, page_nums, drawings)
+    finally:
+        doc.close()
+
 class TOCAnalyzer:
-    def __init__(self, pdf_path):
-        self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
-        self.toc = self.doc.get_toc(simple=False)
+    def __init__(self, pdf):
+        """Analyze a PDF given by path, or an already open fitz.Document the caller keeps owning"""
+        if isinstance(pdf, fitz.Document):
+            # Shared with the caller (e.g. a pipeline that also runs toc_extractor on it),
+            # so the PDF is parsed once and close() leaves it open
+            self.doc = pdf
+            self.pdf_path = pdf.name
+            self._owns_doc = False
+            # Its name is empty for a stream-opened document (and the file may not match an
+            # edited one), so it is never reopened by name, e.g. by page analysis workers
+            self._reopenable = False
+        else:
+            self.pdf_path = pdf
+            self.doc = fitz.open(pdf)
+            self._owns_doc = True
+            self._reopenable = True
+        # [level, title, page] rows: nothing here reads the link destinations, so they
+        # are not resolved
+        self.toc = self.doc.get_toc(simple=True)
+        self.page_count = self.doc.page_count
         self.level_analysis = defaultdict(list)
         self.document_stats = None  # Will be populated during detailed analysis
+        self._analysis = None  # Cached analyze_structure() report
         self.semantic_patterns = {
             'chapter_indicators': ['chapter', 'part', 'section', 'book', 'volume'],
             'content_types': {
@@ -42,108 +169,137 @@ class TOCAnalyzer:
             'structural_words': ['overview', 'introduction', 'summary', 'conclusion', 'description']
         }
         
+        # Tag every keyword with the (group, label) hits it scores: chapter and structural words
+        # count per word, content words once per category.
+        keyword_tags = defaultdict(set)
+        for word in self.semantic_patterns['chapter_indicators']:
+            keyword_tags[word].add(('chapter', word))
+        for category, words in self.semantic_patterns['content_types'].items():
+            for word in words:
+                keyword_tags[word].add(('content', category))
+        for word in self.semantic_patterns['structural_words']:
+            keyword_tags[word].add(('structural', word))
+        
+        # All groups are matched in one scan of the title. The lookahead reports the longest
+        # keyword starting at each position, so each keyword also carries the tags of the
+        # keywords inside it ("methodology" contains "method"). Matching is plain substring
+        # with no word boundaries, like the original checks.
+        self._keyword_hits = {word: frozenset().union(*(tags for other, tags in keyword_tags.items()
+                                                        if other in word))
+                              for word in keyword_tags}
+        longest_first = sorted(keyword_tags, key=len, reverse=True)
+        self._keyword_scan_re = re.compile('(?=(' + '|'.join(map(re.escape, longest_first)) + '))')
+        # Categories are kept in declaration order (not as a set) so content type counts fill
+        # in the same order every run and most_common() ties resolve the same way
+        self._content_categories = tuple(self.semantic_patterns['content_types'])
+        self._article_re = self._keyword_re(['the', 'a', 'an'])
+        self._digit_re = re.compile(r'\d')
+    
+    @staticmethod
+    def _keyword_re(words):
+        """Compile a list of keywords into a single substring-matching alternation"""
+        return re.compile('|'.join(map(re.escape, words)))
+        
     def analyze_structure(self):
-        """Comprehensive structural analysis of the TOC"""
+        """Comprehensive structural analysis of the TOC (computed once, then cached)"""
         
         if not self.toc:
             return None
+        
+        if self._analysis is not None:
+            return self._analysis
             
+        # Bookmark titles repeat a lot ("Spells", "Monsters"), so the per-title work is
+        # done once per distinct title and shared by every entry that uses it
+        title_info = {}
+        
         # Organize entries by level
+        level_analysis = self.level_analysis
         for idx, entry in enumerate(self.toc):
-            if len(entry) >= 3:
-                level, title, page = entry[0], entry[1], entry[2]
-                self.level_analysis[level].append({
-                    'index': idx,
-                    'title': title,
-                    'page': page,
+            try:
+                level, title, page, *_ = entry
+            except ValueError:
+                debug_print(f"Skipping malformed TOC entry {idx}: {entry}")
+                continue
+            info = title_info.get(title)
+            if info is None:
+                # Scan for keywords once here, scoring and level stats reuse the hits
+                title_lower = title.lower()
+                hits = self._title_keyword_hits(title_lower)
+                info = title_info[title] = {
+                    'title_lower': title_lower,
                     'title_length': len(title),
                     'word_count': len(title.split()),
-                    'semantic_score': self._calculate_semantic_score(title)
-                })
-            else:
-                debug_print(f"Skipping malformed TOC entry {idx}: {entry}")
-        
-        return self._generate_analysis_report()
+                    'categories': tuple(category for category in self._content_categories
+                                        if ('content', category) in hits),
+                    'semantic_score': self._calculate_semantic_score(title, hits),
+                    'has_number': self._digit_re.search(title) is not None,
+                    'has_article': self._article_re.search(title_lower) is not None,
+                    'proper_case': title.istitle()
+                }
+            level_analysis[level].append({
+                'index': idx,
+                'title': title,
+                'page': page,
+                **info
+            })
+        
+        self._analysis = self._generate_analysis_report()
+        return self._analysis
     
-    def analyze_document_details(self, sample_pages=10):
-        """Perform detailed document analysis with font, image, and drawing statistics"""
+    def analyze_document_details(self, sample_pages=10, drawings=True):
+        """Perform detailed document analysis with font, image, and drawing statistics
         
-        print(f"🔬 Performing detailed document analysis...")
+        With drawings=False the vector drawing count is skipped and reported as None.
+        """
         
-        # Initialize counters
-        total_images = 0
-        total_drawings = 0
-        total_links = 0
-        font_analysis = defaultdict(int)
-        font_sizes = []
-        text_blocks = 0
-        total_chars = 0
+        print(f"🔬 Performing detailed document analysis...")
         
         # Sample pages for analysis (don't analyze every page for large docs)
-        page_count = self.doc.page_count
+        page_count = self.page_count
         if page_count <= sample_pages:
             pages_to_analyze = range(page_count)
             sample_note = ""
         else:
-            # Sample evenly distributed pages
-            step = page_count // sample_pages
-            pages_to_analyze = range(0, page_count, step)
+            # Exactly sample_pages pages, spread evenly from the first to the last page
+            if sample_pages > 1:
+                pages_to_analyze = [i * (page_count - 1) // (sample_pages - 1) for i in range(sample_pages)]
+            else:
+                pages_to_analyze = [0]
             sample_note = f" (sampled {len(pages_to_analyze)}/{page_count} pages)"
         
         debug_print(f"Analyzing pages: {list(pages_to_analyze)}")
         
-        for page_num in pages_to_analyze:
-            try:
-                page = self.doc[page_num]
-                
-                # Image analysis
-                images = page.get_images()
-                total_images += len(images)
-                
-                # Drawing analysis
-                drawings = page.get_drawings()
-                total_drawings += len(drawings)
-                
-                # Link analysis
-                links = page.get_links()
-                total_links += len(links)
-                
-                # Detailed text analysis with font information
-                text_dict = page.get_text("dict")
-                
-                for block in text_dict.get("blocks", []):
-                    if "lines" in block:  # Text block
-                        text_blocks += 1
-                        
-                        for line in block["lines"]:
-                            for span in line.get("spans", []):
-                                # Font analysis
-                                font_name = span.get("font", "Unknown")
-                                font_size = span.get("size", 0)
-                                text_content = span.get("text", "")
-                                
-                                font_analysis[font_name] += len(text_content)
-                                font_sizes.append(font_size)
-                                total_chars += len(text_content)
-                
-            except Exception as e:
-                debug_print(f"Error analyzing page {page_num}: {e}")
-                continue
+        # Parallelism is process based only, like content_analyzer: PyMuPDF documents are
+        # not thread-safe and extraction holds the GIL, so threads would not overlap work.
+        # Workers reopen the PDF by path, so a document the caller passed in is analyzed here.
+        workers = min(os.cpu_count() or 1, len(pages_to_analyze) // PARALLEL_MIN_PAGES + 1)
+        if workers > 1 and self._reopenable:
+            totals, font_analysis, font_sizes = self._analyze_pages_parallel(pages_to_analyze, workers, drawings)
+        else:
+            totals, font_analysis, font_sizes = analyze_pages(self._document(), pages_to_analyze, drawings)
+        
+        total_images = totals['images']
+        total_drawings = totals['drawings'] if drawings else None
+        total_links = totals['links']
+        text_blocks = totals['text_blocks']
+        total_chars = totals['characters']
         
         # Calculate statistics
         unique_fonts = len(font_analysis)
-        avg_font_size = statistics.mean(font_sizes) if font_sizes else 0
-        median_font_size = statistics.median(font_sizes) if font_sizes else 0
+        # Sort once: median and range read straight off the sorted sizes, fmean stays in C
+        sorted_sizes = sorted(font_sizes)
+        avg_font_size = statistics.fmean(sorted_sizes) if sorted_sizes else 0
+        median_font_size = statistics.median(sorted_sizes) if sorted_sizes else 0
+        font_size_range = (sorted_sizes[0], sorted_sizes[-1]) if sorted_sizes else (0, 0)
         
-        # Font size distribution analysis
-        font_size_distribution = defaultdict(int)
-        for size in font_sizes:
-            # Group font sizes into ranges
-            size_range = f"{int(size//2)*2}-{int(size//2)*2+1}pt"
-            font_size_distribution[size_range] += 1
+        # Font size distribution analysis: count 2pt buckets, format labels once per bucket
+        bucket_counts = Counter(int(size // 2) * 2 for size in font_sizes)
+        font_size_distribution = {f"{bucket}-{bucket + 1}pt": count
+                                  for bucket, count in bucket_counts.items()}
         
         # Most common fonts
-        top_fonts = sorted(font_analysis.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_fonts = font_analysis.most_common(5)
         
         self.document_stats = {
             'sample_info': {
@@ -158,42 +314,72 @@ class TOCAnalyzer:
                 'text_blocks': text_blocks,
                 'total_characters': total_chars,
                 'avg_images_per_page': total_images / len(pages_to_analyze) if pages_to_analyze else 0,
-                'avg_drawings_per_page': total_drawings / len(pages_to_analyze) if pages_to_analyze else 0,
+                'avg_drawings_per_page': (None if total_drawings is None else
+                                          total_drawings / len(pages_to_analyze) if pages_to_analyze else 0),
                 'avg_chars_per_page': total_chars / len(pages_to_analyze) if pages_to_analyze else 0
             },
             'font_analysis': {
                 'unique_fonts': unique_fonts,
                 'avg_font_size': avg_font_size,
                 'median_font_size': median_font_size,
-                'font_size_range': (min(font_sizes), max(font_sizes)) if font_sizes else (0, 0),
+                'font_size_range': font_size_range,
                 'top_fonts': top_fonts,
-                'font_size_distribution': dict(font_size_distribution)
+                'font_size_distribution': font_size_distribution
             }
         }
         
         return self.document_stats
     
-    def _calculate_semantic_score(self, title):
+    def _analyze_pages_parallel(self, pages_to_analyze, workers, drawings=True):
+        """Analyze pages across worker processes, one contiguous chunk of pages per worker"""
+        
+        pages_to_analyze = list(pages_to_analyze)
+        chunk_size = -(-len(pages_to_analyze) // workers)
+        chunks = [pages_to_analyze[i:i + chunk_size] for i in range(0, len(pages_to_analyze), chunk_size)]
+        debug_print(f"Analyzing pages with {len(chunks)} worker processes")
+        
+        totals = Counter()
+        font_analysis = Counter()
+        font_sizes = array(SPAN_SIZE_TYPECODE)
+        
+        # Results come back in chunk order, so font sizes keep the same order as a serial run
+        # Workers are spawned, not forked, so this is safe to call from a thread of a
+        # multi-threaded process (forking one can deadlock on locks held by other threads)
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as executor:
+            for chunk_totals, chunk_fonts, chunk_sizes in executor.map(
+                    _analyze_pages_worker, [self.pdf_path] * len(chunks), chunks, [drawings] * len(chunks)):
+                totals.update(chunk_totals)
+                font_analysis.update(chunk_fonts)
+                font_sizes.extend(chunk_sizes)
+        
+        return totals, font_analysis, font_sizes
+    
+    def _title_keyword_hits(self, title_lower):
+        """Return the (group, label) hits for every keyword in a lowercased title
+        
+        The label is the keyword itself for chapter and structural words and the category
+        for content words, so each hit scores exactly once.
+        """
+        hits = set()
+        for word in self._keyword_scan_re.findall(title_lower):
+            hits |= self._keyword_hits[word]
+        return hits
+    
+    def _calculate_semantic_score(self, title, hits=None):
         """Calculate semantic meaningfulness of a title"""
         score = 0
-        title_lower = title.lower()
+        if hits is None:
+            hits = self._title_keyword_hits(title.lower())
+        groups = Counter(group for group, _ in hits)
         
-        # Chapter/section indicators (high value)
-        for indicator in self.semantic_patterns['chapter_indicators']:
-            if indicator in title_lower:
-                score += 10
+        # Chapter/section indicators (high value), once per distinct indicator
+        score += 10 * groups['chapter']
         
-        # Content type indicators (medium-high value)
-        for category, words in self.semantic_patterns['content_types'].items():
-            for word in words:
-                if word in title_lower:
-                    score += 7
-                    break  # Only count once per category
+        # Content type indicators (medium-high value), only count once per category
+        score += 7 * groups['content']
         
-        # Structural indicators (medium value)
-        for word in self.semantic_patterns['structural_words']:
-            if word in title_lower:
-                score += 5
+        # Structural indicators (medium value), once per distinct word
+        score += 5 * groups['structural']
         
         # Length and complexity indicators
         word_count = len(title.split())
@@ -207,7 +393,7 @@ class TOCAnalyzer:
             score += 2
         
         # Numeric patterns (often indicate structured content)
-        if re.search(r'\d', title):
+        if self._digit_re.search(title):
             score += 1
         
         return score
@@ -218,50 +404,30 @@ class TOCAnalyzer:
         if not entries:
             return {}
         
-        # Basic statistics
-        title_lengths = [e['title_length'] for e in entries]
-        word_counts = [e['word_count'] for e in entries]
-        semantic_scores = [e['semantic_score'] for e in entries]
-        page_ranges = []
-        
-        # Calculate page ranges for entries
-        for i, entry in enumerate(entries):
-            if i + 1 < len(entries):
-                next_page = entries[i + 1]['page']
-                page_range = next_page - entry['page']
-            else:
-                # Last entry - use document end
-                page_range = self.doc.page_count - entry['page'] + 1
-            page_ranges.append(page_range)
+        count = len(entries)
+        
+        # Page ranges: the gap to the next entry, the last entry runs to the document end
+        pages = [e['page'] for e in entries]
+        page_ranges = [next_page - page for page, next_page in zip(pages, pages[1:])]
+        page_ranges.append(self.page_count - pages[-1] + 1)
         
         # Content type analysis
-        content_types = defaultdict(int)
-        for entry in entries:
-            title_lower = entry['title'].lower()
-            for category, words in self.semantic_patterns['content_types'].items():
-                for word in words:
-                    if word in title_lower:
-                        content_types[category] += 1
-                        break
-        
-        # Structural patterns
-        has_numbers = sum(1 for e in entries if re.search(r'\d', e['title']))
-        has_articles = sum(1 for e in entries if any(word in e['title'].lower() 
-                                                   for word in ['the', 'a', 'an']))
-        proper_case = sum(1 for e in entries if e['title'].istitle())
+        content_types = Counter(category for e in entries for category in e['categories'])
         
+        # Title features were computed per distinct title in analyze_structure, so the level
+        # stats are plain sums over the entries (integer sums divide exactly like statistics.mean)
         return {
-            'count': len(entries),
-            'avg_title_length': statistics.mean(title_lengths) if title_lengths else 0,
-            'avg_word_count': statistics.mean(word_counts) if word_counts else 0,
-            'avg_semantic_score': statistics.mean(semantic_scores) if semantic_scores else 0,
-            'avg_page_range': statistics.mean(page_ranges) if page_ranges else 0,
-            'median_page_range': statistics.median(page_ranges) if page_ranges else 0,
-            'content_types': dict(content_types),
+            'count': count,
+            'avg_title_length': sum(e['title_length'] for e in entries) / count,
+            'avg_word_count': sum(e['word_count'] for e in entries) / count,
+            'avg_semantic_score': sum(e['semantic_score'] for e in entries) / count,
+            'avg_page_range': sum(page_ranges) / count,
+            'median_page_range': statistics.median(page_ranges),
+            'content_types': content_types,
             'structural_patterns': {
-                'has_numbers_pct': (has_numbers / len(entries)) * 100,
-                'has_articles_pct': (has_articles / len(entries)) * 100,
-                'proper_case_pct': (proper_case / len(entries)) * 100
+                'has_numbers_pct': (sum(e['has_number'] for e in entries) / count) * 100,
+                'has_articles_pct': (sum(e['has_article'] for e in entries) / count) * 100,
+                'proper_case_pct': (sum(e['proper_case'] for e in entries) / count) * 100
             },
             'sample_titles': [e['title'] for e in entries[:5]]
         }
@@ -318,8 +484,10 @@ class TOCAnalyzer:
         analysis = {}
         
         # Analyze each level
+        content_types = Counter()
         for level, entries in self.level_analysis.items():
             analysis[level] = self._analyze_level_characteristics(level, entries)
+            content_types.update(analysis[level]['content_types'])
         
         # Determine optimal levels
         ranked_levels, level_scores = self._determine_optimal_levels(analysis)
@@ -328,12 +496,13 @@ class TOCAnalyzer:
             'level_analysis': analysis,
             'level_scores': level_scores,
             'ranked_levels': ranked_levels,
+            'content_types': content_types,  # Totals across all levels
             'total_entries': len(self.toc),
             'max_level': max(self.level_analysis.keys()) if self.level_analysis else 0,
-            'document_pages': self.doc.page_count
+            'document_pages': self.page_count
         }
     
-    def print_diagnostic_report(self, detailed=False):
+    def print_diagnostic_report(self, detailed=False, drawings=True):
         """Print comprehensive diagnostic report"""
         
         print(f"\n🔍 TOC Intelligence Analysis: {Path(self.pdf_path).name}")
@@ -344,6 +513,9 @@ class TOCAnalyzer:
             return
         
         analysis_data = self.analyze_structure()
+        if not detailed:
+            # Everything below reads the cached analysis, so free MuPDF's caches now
+            self.close()
         
         # Document overview
         print(f"📊 Document Overview:")
@@ -353,11 +525,11 @@ class TOCAnalyzer:
         
         # Detailed document analysis if requested
         if detailed:
-            self._print_detailed_document_stats()
+            self._print_detailed_document_stats(drawings)
         
-        # Level-by-level analysis
-        print(f"\n📋 Level Analysis & Recommendations:")
-        print("-" * 60)
+        # Level-by-level analysis, collected and printed in one go rather than a
+        # print() call per line of every level
+        listing = [f"\n📋 Level Analysis & Recommendations:", "-" * 60]
         
         for rank, (level, score) in enumerate(analysis_data['ranked_levels'], 1):
             stats = analysis_data['level_analysis'][level]
@@ -372,26 +544,27 @@ class TOCAnalyzer:
             else:
                 recommendation = "⚪ Low priority"
             
-            print(f"Level {level}: {recommendation}")
-            print(f"   Entries: {stats['count']}")
-            print(f"   Avg Pages/Entry: {stats['avg_page_range']:.1f}")
-            print(f"   Semantic Score: {stats['avg_semantic_score']:.1f}/10")
-            print(f"   Intelligence Score: {score:.1f}/100")
+            listing.append(f"Level {level}: {recommendation}")
+            listing.append(f"   Entries: {stats['count']}")
+            listing.append(f"   Avg Pages/Entry: {stats['avg_page_range']:.1f}")
+            listing.append(f"   Semantic Score: {stats['avg_semantic_score']:.1f}/10")
+            listing.append(f"   Intelligence Score: {score:.1f}/100")
             
             # Content type breakdown
             if stats['content_types']:
                 content_summary = ', '.join([f"{k}({v})" for k, v in 
-                                           sorted(stats['content_types'].items(), 
-                                                  key=lambda x: x[1], reverse=True)[:3]])
-                print(f"   Content Types: {content_summary}")
+                                           stats['content_types'].most_common(3)])
+                listing.append(f"   Content Types: {content_summary}")
             
             # Sample titles
             if detailed and stats['sample_titles']:
-                print(f"   Sample Titles:")
+                listing.append(f"   Sample Titles:")
                 for title in stats['sample_titles'][:3]:
-                    print(f"      • {title}")
+                    listing.append(f"      • {title}")
             
-            print()
+            listing.append("")
+        
+        print("\n".join(listing))
         
         # Extraction recommendations
         self._print_extraction_recommendations(analysis_data)
@@ -399,11 +572,11 @@ class TOCAnalyzer:
         # Content-specific insights
         self._print_content_insights(analysis_data)
     
-    def _print_detailed_document_stats(self):
+    def _print_detailed_document_stats(self, drawings=True):
         """Print detailed document statistics including fonts, images, and drawings"""
         
         if not self.document_stats:
-            self.analyze_document_details()
+            self.analyze_document_details(drawings=drawings)
         
         stats = self.document_stats
         print(f"\n🔬 Detailed Document Analysis{stats['sample_info']['sample_note']}:")
@@ -413,7 +586,10 @@ class TOCAnalyzer:
         content = stats['content_stats']
         print(f"📊 Content Statistics:")
         print(f"   📸 Images: {content['total_images']} total ({content['avg_images_per_page']:.1f}/page)")
-        print(f"   🎨 Drawings/Graphics: {content['total_drawings']} total ({content['avg_drawings_per_page']:.1f}/page)")
+        if content['total_drawings'] is None:
+            print(f"   🎨 Drawings/Graphics: skipped")
+        else:
+            print(f"   🎨 Drawings/Graphics: {content['total_drawings']} total ({content['avg_drawings_per_page']:.1f}/page)")
         print(f"   🔗 Links: {content['total_links']} total")
         print(f"   📝 Text Blocks: {content['text_blocks']:,}")
         print(f"   📄 Characters: {content['total_characters']:,} ({content['avg_chars_per_page']:,.0f}/page)")
@@ -456,32 +632,15 @@ class TOCAnalyzer:
         
         print(f"\n📋 Document Type Indicators:")
         
-        # Visual content analysis
-        if content['avg_images_per_page'] > 2:
-            print(f"   🖼️  Image-rich document (good for illustrated manuals, reports)")
-        elif content['avg_images_per_page'] > 0.5:
-            print(f"   📷 Moderate image content (typical for structured documents)")
-        else:
-            print(f"   📝 Text-heavy document (typical for academic, legal, or reference)")
-        
-        # Graphics analysis
-        if content['avg_drawings_per_page'] > 1:
-            print(f"   🎨 High graphic content (charts, diagrams, technical illustrations)")
-        
-        # Font diversity analysis
-        if font['unique_fonts'] > 10:
-            print(f"   🔤 High font diversity (complex formatting, possibly design-heavy)")
-        elif font['unique_fonts'] < 5:
-            print(f"   📰 Simple font structure (clean, readable document)")
-        
-        # Font size analysis for structure detection
+        # Visual content, graphics, font diversity and font size spread, each from its tier table
         font_range = font['font_size_range'][1] - font['font_size_range'][0]
-        if font_range > 20:
-            print(f"   📐 Wide font size range (strong hierarchical structure)")
-        elif font_range > 10:
-            print(f"   📏 Moderate font size variation (good heading structure)")
-        else:
-            print(f"   ➖ Minimal font size variation (uniform text, limited hierarchy)")
+        for value, tiers in ((content['avg_images_per_page'], IMAGE_TIERS),
+                             (content['avg_drawings_per_page'], DRAWING_TIERS),
+                             (font['unique_fonts'], FONT_DIVERSITY_TIERS),
+                             (font_range, FONT_RANGE_TIERS)):
+            message = tier_message(value, tiers)
+            if message:
+                print(f"   {message}")
     
     def _print_extraction_recommendations(self, analysis_data):
         """Print specific extraction strategy recommendations"""
@@ -526,15 +685,11 @@ class TOCAnalyzer:
         print(f"\n📋 Document Content Analysis:")
         print("-" * 40)
         
-        # Aggregate content types across all levels
-        all_content_types = defaultdict(int)
-        
-        for level, stats in analysis_data['level_analysis'].items():
-            for content_type, count in stats['content_types'].items():
-                all_content_types[content_type] += count
+        # Content types across all levels (aggregated once in the analysis report)
+        all_content_types = analysis_data['content_types']
         
         # Determine document type and primary characteristics
-        document_characteristics = self._analyze_document_type(analysis_data)
+        document_characteristics = self._analyze_document_type(all_content_types)
         
         print(f"📄 Document Type: {document_characteristics['type']}")
         print(f"🎯 Primary Focus: {document_characteristics['focus']}")
@@ -543,7 +698,7 @@ class TOCAnalyzer:
         total_content = sum(all_content_types.values())
         if total_content > 0:
             # Print top content categories with percentages
-            top_content = sorted(all_content_types.items(), key=lambda x: x[1], reverse=True)[:4]
+            top_content = all_content_types.most_common(4)
             print(f"🏆 Content Distribution:")
             for category, count in top_content:
                 percentage = (count / total_content) * 100
@@ -562,21 +717,14 @@ class TOCAnalyzer:
             for note in extraction_notes:
                 print(f"   {note}")
     
-    def _analyze_document_type(self, analysis_data):
-        """Determine the document type based on content patterns"""
-        
-        # Aggregate all content
-        all_content = defaultdict(int)
-        for level_stats in analysis_data['level_analysis'].values():
-            for content_type, count in level_stats['content_types'].items():
-                all_content[content_type] += count
+    def _analyze_document_type(self, all_content):
+        """Determine the document type from the content type counts aggregated across levels"""
         
         if not all_content:
             return {'type': 'General Document', 'focus': 'Mixed Content'}
         
         # Determine primary type
-        top_category = max(all_content.items(), key=lambda x: x[1])
-        category_name, category_count = top_category
+        category_name, category_count = all_content.most_common(1)[0]
         
         document_types = {
             'financial': {'type': 'Financial/Business Document', 'focus': 'Financial reporting and business operations'},
@@ -659,10 +807,25 @@ class TOCAnalyzer:
         
         return notes
     
+    def _document(self):
+        """Return the open PDF document, reopening it if it was closed after the TOC read"""
+        if self.doc is None:
+            self.doc = fitz.open(self.pdf_path)
+            self._owns_doc = True
+        return self.doc
+    
     def close(self):
-        """Close the PDF document"""
-        if hasattr(self, 'doc'):
+        """Close the PDF document unless the caller passed it in, which stays attached
+        (page access through _document() reopens a closed one)"""
+        if getattr(self, 'doc', None) is not None and self._owns_doc:
             self.doc.close()
+            self.doc = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -674,12 +837,15 @@ Examples:
   python toc_diagnostic.py document.pdf --detailed
   python toc_diagnostic.py report.pdf --debug
   python toc_diagnostic.py complex_doc.pdf -d    # Full analysis with fonts/images
+  python toc_diagnostic.py big_manual.pdf -d --no-drawings    # Skip the slow vector drawing count
         """
     )
     
     parser.add_argument('input_pdf', help='Path to PDF file to analyze')
     parser.add_argument('--detailed', '-d', action='store_true', 
                        help='Show detailed analysis including fonts, images, drawings, and sample titles')
+    parser.add_argument('--no-drawings', action='store_true',
+                       help='With --detailed, skip counting vector drawings (the slowest per-page step)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     
     args = parser.parse_args()
@@ -693,9 +859,8 @@ Examples:
         return 1
     
     try:
-        analyzer = TOCAnalyzer(args.input_pdf)
-        analyzer.print_diagnostic_report(detailed=args.detailed)
-        analyzer.close()
+        with TOCAnalyzer(args.input_pdf) as analyzer:
+            analyzer.print_diagnostic_report(detailed=args.detailed, drawings=not args.no_drawings)
         return 0
         
     except Exception as e:
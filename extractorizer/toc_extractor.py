@@ -4,127 +4,275 @@ Simple TOC Extractor - Test script for extracting table of contents from PDF fil
 """
 
 import os
+import sys
+import io
+import hashlib
+import json
 import fitz  # PyMuPDF
 import argparse
+import re
+import string
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import repeat
 from pathlib import Path
 
 # Configuration
 DEBUG = True
 
+# Filename sanitizing tables, built once rather than on every sanitize_filename call.
+# Every ASCII byte other than letters, digits, space, '_' and '-' is deleted from titles.
+SAFE_FILENAME_CHARS = frozenset(string.ascii_letters + string.digits + " _-")
+UNSAFE_FILENAME_BYTES = bytes(c for c in range(128) if chr(c) not in SAFE_FILENAME_CHARS)
+REPEATED_UNDERSCORES_RE = re.compile(r'_+')
+# Extracted TOCs are saved here as JSON, keyed by file path and checked against the file's
+# size and modification time, so re-runs (e.g. trying other --level values) skip MuPDF.
+# Shares the content analyzer's cache directory; empty PDF_STRUCTURE_CACHE_DIR disables it.
+TOC_CACHE_DIR = os.getenv("PDF_STRUCTURE_CACHE_DIR", os.path.join(".cache", "pdf_structure"))
+TOC_CACHE_VERSION = 1
+
 def debug_print(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
-def extract_and_display_toc(pdf_path, chapter_level=1):
+def _toc_cache_path(pdf_path):
+    """Where the extracted TOC of pdf_path is cached (None when the disk cache is disabled)"""
+    if not TOC_CACHE_DIR:
+        return None
+    name = hashlib.sha1(os.path.realpath(pdf_path).encode('utf-8')).hexdigest()
+    return os.path.join(TOC_CACHE_DIR, f"toc-{name}.json")
+
+def _load_cached_toc(cache_path, stat):
+    """Cached TOC info if it was saved for this exact file version, otherwise None"""
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = json.load(f)
+        if (cached['version'], cached['size'], cached['mtime_ns']) == (TOC_CACHE_VERSION, stat.st_size, stat.st_mtime_ns):
+            return cached['info']
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        debug_print(f"Ignoring unreadable cached TOC {cache_path}: {e}")
+    return None
+
+def _store_toc(cache_path, stat, info):
+    """Best effort write of freshly extracted TOC info to the disk cache"""
+    try:
+        os.makedirs(TOC_CACHE_DIR, exist_ok=True)
+        # Written under a temporary name first so readers never see a partial file
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TOC_CACHE_VERSION, 'size': stat.st_size,
+                       'mtime_ns': stat.st_mtime_ns, 'info': info}, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        debug_print(f"Could not write TOC cache {cache_path}: {e}")
+
+def _toc_info(doc):
+    """The outline of an open document plus the few document facts the report shows"""
+    debug_print("Extracting table of contents...")
+    return {
+        'metadata': {key: doc.metadata.get(key, 'N/A') for key in ('title', 'author', 'creationDate')},
+        'page_count': doc.page_count,
+        # Only level, title and page are used, so skip resolving every entry's destination
+        'toc': doc.get_toc(simple=True)
+    }
+
+def read_toc(pdf_path, use_cache=True):
+    """Read a PDF's outline along with the document facts the report shows
+    
+    Returns {'metadata': {...}, 'page_count': int, 'toc': [[level, title, page], ...]}.
+    With use_cache, a result saved for the same unchanged file is returned without
+    opening the PDF at all. pdf_path may also be an open fitz.Document, which is read
+    directly and left open for the caller.
+    """
+    if isinstance(pdf_path, fitz.Document):
+        return _toc_info(pdf_path)
+    
+    stat = os.stat(pdf_path)
+    cache_path = _toc_cache_path(pdf_path) if use_cache else None
+    if cache_path:
+        info = _load_cached_toc(cache_path, stat)
+        if info is not None:
+            debug_print(f"Using cached TOC from {cache_path}")
+            return info
+    
+    # Open the PDF
+    debug_print("Opening PDF document...")
+    # The input is always a PDF, so tell MuPDF instead of having it guess the format.
+    # Nothing here loads a page: metadata, page_count and the outline come from the catalog.
+    doc = fitz.open(pdf_path, filetype="pdf")
+    try:
+        info = _toc_info(doc)
+    finally:
+        doc.close()
+    
+    if cache_path:
+        _store_toc(cache_path, stat, info)
+    return info
+
+def _iter_chapters(toc, level, total_pages):
+    """Yield (number, title, start_page, end_page, page_count, sanitized_name) per chapter
+    
+    Chapters are the TOC entries at `level`. Each one ends the page before the next one
+    starts and the last one at the document end, so only one entry is held back at a time.
+    """
+    def chapter(number, title, start_page, end_page):
+        return number, title, start_page, end_page, end_page - start_page + 1, sanitize_filename(title)
+    
+    pending = None
+    for number, (title, start_page) in enumerate(
+            ((title, page) for entry_level, title, page in toc if entry_level == level), 1):
+        if pending:
+            yield chapter(*pending, start_page - 1)
+        pending = (number, title, start_page)
+    if pending:
+        yield chapter(*pending, total_pages)
+
+def extract_and_display_toc(pdf_path, chapter_level=1, use_cache=True, return_list=True,
+                            max_display_level=None):
     """Extract and display the table of contents from a PDF
     
     Args:
-        pdf_path: Path to the PDF file
+        pdf_path: Path to the PDF file, or an open fitz.Document (left open, e.g. when the
+            same document is also handed to a TOCAnalyzer)
         chapter_level: TOC level to use for chapter breaks (1=top level, 2=second level, etc.)
+        use_cache: Reuse (and save) the extracted TOC in the disk cache
+        return_list: Return the chapters as a list of (level, title, page) entries. When False
+            only the number of chapters is returned and no chapter list is built.
+        max_display_level: Only list (and debug print) entries up to this TOC level. The level
+            summary and the chapters still cover the whole TOC.
     """
     
+    doc = pdf_path if isinstance(pdf_path, fitz.Document) else None
+    if doc is not None:
+        pdf_path = doc.name
+    
     print(f"\n📖 Analyzing PDF: {pdf_path}")
     print("=" * 60)
     
-    if not os.path.exists(pdf_path):
-        print(f"❌ Error: File '{pdf_path}' not found.")
-        return None
-    
     try:
-        # Open the PDF
-        debug_print("Opening PDF document...")
-        doc = fitz.open(pdf_path)
+        info = read_toc(pdf_path if doc is None else doc, use_cache)
+        metadata = info['metadata']
+        document_pages = info['page_count']
+        toc = info['toc']
         
         # Basic document info
         print(f"📄 Document Info:")
-        print(f"   Title: {doc.metadata.get('title', 'N/A')}")
-        print(f"   Author: {doc.metadata.get('author', 'N/A')}")
-        print(f"   Pages: {doc.page_count}")
-        print(f"   Created: {doc.metadata.get('creationDate', 'N/A')}")
-        
-        # Extract TOC
-        debug_print("Extracting table of contents...")
-        toc = doc.get_toc(simple=False)
+        print(f"   Title: {metadata['title']}")
+        print(f"   Author: {metadata['author']}")
+        print(f"   Pages: {document_pages}")
+        print(f"   Created: {metadata['creationDate']}")
         
         if not toc:
             print("\n⚠️  No table of contents found in this PDF")
             print("   The document may not have bookmarks or TOC entries")
-            doc.close()
-            return []
+            return [] if return_list else 0
         
         print(f"\n📚 Table of Contents ({len(toc)} entries):")
         print(f"   Using level {chapter_level} entries as chapter breaks")
+        # Deeper entries are dropped up front so the listing loops below never see them
+        display_toc = toc
+        if max_display_level is not None:
+            display_toc = [entry for entry in toc if entry[0] <= max_display_level]
+            print(f"   Listing entries up to level {max_display_level} ({len(display_toc)} entries)")
         print("-" * 60)
         
-        # Display TOC entries (limited to avoid overwhelming output)
-        chapters = []
-        level_counts = {}
+        # Display TOC entries (limited to avoid overwhelming output). Lines are collected and
+        # printed together at the end instead of one print() per entry.
+        listing = []
+        for idx, (level, title, page) in enumerate(display_toc[:20]):
+            indent = "  " * (level - 1)
+            level_marker = "📖" if level == 1 else "📝" if level == 2 else "•" if level == 3 else "◦"
+            listing.append(f"{indent}{level_marker} {title} (Page {page})")
+            if DEBUG:
+                listing.append(f"[DEBUG] Entry {idx}: Level={level}, Title='{title}', Page={page}")
+        if len(display_toc) > 20:
+            listing.append("   ... (showing first 20 entries)")
+        
+        # The rest of the entries only get debug lines, so skip the loop entirely when debug is off
+        if DEBUG:
+            listing.extend(f"[DEBUG] Entry {idx}: Level={level}, Title='{title}', Page={page}"
+                           for idx, (level, title, page) in enumerate(display_toc[20:], 20))
         
-        # Count entries by level and collect potential chapters
-        for idx, entry in enumerate(toc):
-            if len(entry) >= 3:
-                level, title, page = entry[0], entry[1], entry[2]
-                
-                # Count by level
-                level_counts[level] = level_counts.get(level, 0) + 1
-                
-                # Show first 20 entries for overview
-                if idx < 20:
-                    indent = "  " * (level - 1)
-                    level_marker = "📖" if level == 1 else "📝" if level == 2 else "•" if level == 3 else "◦"
-                    print(f"{indent}{level_marker} {title} (Page {page})")
-                elif idx == 20:
-                    print("   ... (showing first 20 entries)")
-                
-                # Collect chapters at the specified level
-                if level == chapter_level:
-                    chapters.append((level, title, page))
-                
-                debug_print(f"Entry {idx}: Level={level}, Title='{title}', Page={page}")
+        # Count entries by level, which also gives the number of chapters at the specified level
+        level_counts = Counter(level for level, _, _ in toc)
+        chapter_count = level_counts[chapter_level]
         
         # Display level summary
-        print(f"\n📊 TOC Level Summary:")
+        listing.append(f"\n📊 TOC Level Summary:")
         for level in sorted(level_counts.keys()):
-            print(f"   Level {level}: {level_counts[level]} entries")
+            listing.append(f"   Level {level}: {level_counts[level]} entries")
         
-        print(f"\n📋 Found {len(chapters)} chapters at level {chapter_level}:")
-        print("-" * 60)
+        listing.append(f"\n📋 Found {chapter_count} chapters at level {chapter_level}:")
+        listing.append("-" * 60)
         
         # Show chapter ranges
-        if chapters:
+        if chapter_count:
             base_filename = Path(pdf_path).stem.lower().replace(' ', '_').replace('-', '_')
             
-            for idx, (level, title, start_page) in enumerate(chapters):
-                # Calculate end page
-                end_page = doc.page_count
-                if idx + 1 < len(chapters):
-                    _, _, next_start = chapters[idx + 1]
-                    end_page = next_start - 1
-                
-                page_count = end_page - start_page + 1
-                sanitized_name = sanitize_filename(title)
-                
-                print(f"   Chapter {idx+1:2d}: {title}")
-                print(f"              Pages {start_page:3d}-{end_page:3d} ({page_count:3d} pages)")
-                print(f"              Filename: {base_filename}_{sanitized_name}")
-                print()
+            for number, title, start_page, end_page, page_count, sanitized_name in _iter_chapters(
+                    toc, chapter_level, document_pages):
+                listing.append(f"   Chapter {number:2d}: {title}")
+                listing.append(f"              Pages {start_page:3d}-{end_page:3d} ({page_count:3d} pages)")
+                listing.append(f"              Filename: {base_filename}_{sanitized_name}")
+                listing.append("")
         else:
-            print(f"   No chapters found at level {chapter_level}")
-            print(f"   Try using --level 2 for level 2 entries")
+            listing.append(f"   No chapters found at level {chapter_level}")
+            listing.append(f"   Try using --level 2 for level 2 entries")
         
-        doc.close()
-        return chapters
+        print("\n".join(listing))
+        if not return_list:
+            return chapter_count
+        return [(level, title, page) for level, title, page in toc if level == chapter_level]
         
+    except FileNotFoundError:
+        # Raised by the stat in read_toc (or fitz.open), no separate existence check needed
+        print(f"❌ Error: File '{pdf_path}' not found.")
+        return None
     except Exception as e:
         print(f"❌ Error processing PDF: {str(e)}")
         return None
 
+def _extract_worker(pdf_path, chapter_level, use_cache, max_display_level, debug):
+    """Process pool entry point: run one extraction with its report captured, not printed"""
+    global DEBUG
+    DEBUG = debug  # Spawned workers start with the module default
+    report = io.StringIO()
+    with redirect_stdout(report):
+        chapters = extract_and_display_toc(pdf_path, chapter_level, use_cache,
+                                           max_display_level=max_display_level)
+    return report.getvalue(), chapters
+
+def extract_many(pdf_paths, chapter_level=1, jobs=1, use_cache=True, max_display_level=None):
+    """Extract and display the TOC of several PDFs, using up to `jobs` worker processes
+    
+    Reports are printed whole and in input order. Returns {pdf_path: chapters}, where chapters
+    is None for a PDF that could not be processed.
+    """
+    
+    workers = min(jobs, len(pdf_paths))
+    if workers <= 1:
+        return {pdf_path: extract_and_display_toc(pdf_path, chapter_level, use_cache,
+                                                  max_display_level=max_display_level)
+                for pdf_path in pdf_paths}
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for pdf_path, (report, chapters) in zip(pdf_paths, executor.map(
+                _extract_worker, pdf_paths, repeat(chapter_level), repeat(use_cache),
+                repeat(max_display_level), repeat(DEBUG))):
+            sys.stdout.write(report)
+            results[pdf_path] = chapters
+    return results
+
 def sanitize_filename(name):
     """Clean filename for safe file system usage"""
-    import re
-    safe = re.sub(r"[^0-9a-zA-Z _-]", "", name)
+    # Non-ASCII characters are dropped by the encode, the rest of the unsafe ones by translate
+    safe = name.encode('ascii', 'ignore').translate(None, UNSAFE_FILENAME_BYTES).decode('ascii')
     safe = safe.strip().replace(' ', '_').lower()
-    safe = re.sub(r'_+', '_', safe)
+    safe = REPEATED_UNDERSCORES_RE.sub('_', safe)
     return safe.strip('_')
 
 def main():
@@ -135,13 +283,17 @@ def main():
 Examples:
   python toc_extractor.py srd/SRD_CC_v5.2.1.pdf
   python toc_extractor.py srd/SRD_CC_v5.2.1.pdf --level 2
+  python toc_extractor.py srd/SRD_CC_v5.2.1.pdf --max-display-level 1   # List only top level entries
   python toc_extractor.py ../documents/manual.pdf --quiet
+  python toc_extractor.py srd/*.pdf --quiet --jobs 4    # Several PDFs in parallel
         """
     )
     
     parser.add_argument(
         'input_pdf',
-        help='Path to the PDF file to analyze'
+        nargs='+',
+        type=Path,
+        help='Path to the PDF file(s) to analyze'
     )
     parser.add_argument(
         '--level', '-l',
@@ -154,24 +306,54 @@ Examples:
         action='store_true',
         help='Disable debug output'
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Worker processes when analyzing several PDFs (default: 1, 0 = all CPUs)'
+    )
+    parser.add_argument(
+        '--max-display-level',
+        type=int,
+        default=None,
+        help='Only list TOC entries up to this level (default: all levels)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='use_cache',
+        action='store_false',
+        help='Always re-read the PDF instead of reusing a cached TOC'
+    )
     
     args = parser.parse_args()
+    if args.jobs < 1:
+        args.jobs = os.cpu_count() or 1
     
     # Set debug level
     global DEBUG
     DEBUG = not args.quiet
     
-    # Extract and display TOC
-    chapters = extract_and_display_toc(args.input_pdf, args.level)
+    if len(args.input_pdf) > 1:
+        results = extract_many(args.input_pdf, args.level, args.jobs, args.use_cache,
+                               args.max_display_level)
+        failed = [pdf_path for pdf_path, chapters in results.items() if chapters is None]
+        print(f"\n✅ Analyzed {len(results) - len(failed)}/{len(results)} PDFs at level {args.level}")
+        for pdf_path in failed:
+            print(f"   ❌ Failed: {pdf_path}")
+        return 1 if failed else 0
+    
+    # Extract and display TOC, only the number of chapters is needed here
+    chapter_count = extract_and_display_toc(args.input_pdf[0], args.level, args.use_cache, return_list=False,
+                                            max_display_level=args.max_display_level)
     
-    if chapters is None:
+    if chapter_count is None:
         return 1
-    elif len(chapters) == 0:
+    elif chapter_count == 0:
         print(f"\n⚠️  No chapters found at level {args.level}")
         print("   Try using a different --level value")
         return 0
     else:
-        print(f"\n✅ Successfully analyzed {len(chapters)} chapters at level {args.level}")
+        print(f"\n✅ Successfully analyzed {chapter_count} chapters at level {args.level}")
         return 0
 
 if __name__ == '__main__':